@@ -3,6 +3,7 @@ use std::hash::{BuildHasher, Hash};
 use std::ops::Index;
 use std::slice::Iter;
 use smallvec::{Array, SmallVec};
+use ahash::AHashSet;
 use crate::minhash::MinHashType;
 
 /// Container trait to hold point ids in MinHashIndex.
@@ -12,6 +13,7 @@ use crate::minhash::MinHashType;
 /// recall.
 ///
 /// To support efficient removals use `HashSetContainer` which is backed up by `HashSet`
+/// with the `ahash` hasher
 /// If removals are not required or infrequent use `VecContainer`, which is faster and uses less memory.
 /// If the number of similar points is expected to be small use `SmallVecContainer`, which
 /// is backed up by `SmallVec`. `SmallVec` stores small number of elements inline in an array, and
@@ -38,14 +40,14 @@ pub trait IdContainer<T>: Sync + Send {
 
 
 pub struct HashSetContainer<T> {
-    set: HashSet<T>
+    set: AHashSet<T>
 }
 
 impl<T: Hash + Eq + Send + Sync + Clone> IdContainer<T> for HashSetContainer<T> {
 
     fn new() -> Self {
         HashSetContainer {
-            set: HashSet::new()
+            set: AHashSet::new()
         }
     }
     fn push(&mut self, item: T) {
@@ -18,12 +18,15 @@ use num_traits as num;
 
 
 
+/// `$coef` is the type of the hash function coefficients and min hashes, `$coefficients`,
+/// `$min_hashes` and `$min_hashes_batch` are the functions generating the coefficients
+/// and computing min hashes of one document and of a batch of documents.
 macro_rules! make_min_hasher {
-    ($name: ident, $type: ident) => {
+    ($name: ident, $type: ident, $coef: ident, $coefficients: ident, $min_hashes: ident, $min_hashes_batch: ident) => {
         pub struct $name<B: BuildHasher> {
             build_hasher: B,
-            a: Vec<u32>,
-            b: Vec<u32>,
+            a: Vec<$coef>,
+            b: Vec<$coef>,
             num_hashes: usize
         }
 
@@ -40,16 +43,11 @@ macro_rules! make_min_hasher {
 
             pub fn new_with_hasher_and_seed(num_hashes: usize, build_hasher: B, seed: u64) -> Self {
                 let mut rng = StdRng::seed_from_u64(seed);
-                let rand_range1 = Uniform::from(1..MERSENNE_PRIME_31);
-                let rand_range2 = Uniform::from(0..MERSENNE_PRIME_31);
+                let (a, b) = $coefficients(&mut rng, num_hashes);
                 $name {
                     build_hasher,
-                    a: (0..num_hashes)
-                        .map(|_| rand_range1.sample(&mut rng))
-                        .collect(),
-                    b: (0..num_hashes)
-                        .map(|_| rand_range2.sample(&mut rng))
-                        .collect(),
+                    a,
+                    b,
                     num_hashes
                 }
             }
@@ -59,6 +57,63 @@ macro_rules! make_min_hasher {
             pub fn num_hashes(&self) -> usize {
                 self.num_hashes
             }
+
+            #[inline]
+            fn hash_token<U: Hash>(&self, item: U) -> u32 {
+                let mut hasher = self.build_hasher.build_hasher();
+                item.hash(&mut hasher);
+                hasher.finish() as u32
+            }
+
+            fn hash_tokens<T, U>(&self, iter: T) -> Vec<u32>
+                where
+                    T: Iterator<Item = U>,
+                    U: Hash
+            {
+                iter.map(|item| self.hash_token(item)).collect()
+            }
+
+            fn signature_batch_from_hashes(&self, batch: &[Vec<u32>]) -> Vec<Vec<$type>> {
+                let mut min_hashes: Vec<Vec<$coef>> = batch
+                    .iter()
+                    .map(|hashes| vec![if hashes.is_empty() { 0 } else { <$coef>::MAX }; self.num_hashes])
+                    .collect();
+                $min_hashes_batch(batch, &self.a, &self.b, &mut min_hashes);
+                min_hashes
+                    .into_iter()
+                    .map(|min_hashes| min_hashes.into_iter().map(|h| h as $type).collect())
+                    .collect()
+            }
+
+            /// Token hashes are buffered on the stack and folded into the min hashes
+            /// `HASH_BUFFER_LEN` at a time, so the hashes of a document are never collected.
+            fn signature_from_hashes<T>(&self, mut hashes: T) -> Vec<$type>
+                where
+                    T: Iterator<Item = u32>
+            {
+                let mut buffer = [0u32; HASH_BUFFER_LEN];
+                let mut min_hashes = vec![<$coef>::MAX; self.num_hashes];
+                let mut is_empty = true;
+                loop {
+                    let mut len = 0;
+                    for (slot, hash) in buffer.iter_mut().zip(&mut hashes) {
+                        *slot = hash;
+                        len += 1;
+                    }
+                    if len == 0 {
+                        break;
+                    }
+                    is_empty = false;
+                    $min_hashes(&buffer[..len], &self.a, &self.b, &mut min_hashes);
+                    if len < HASH_BUFFER_LEN {
+                        break;
+                    }
+                }
+                match is_empty {
+                    false => min_hashes.into_iter().map(|h| h as $type).collect(),
+                    true => vec![0; self.num_hashes],
+                }
+            }
         }
 
 
@@ -69,32 +124,33 @@ macro_rules! make_min_hasher {
                     T: Iterator<Item = U>,
                     U: Hash
             {
-                let hashes: Vec<u32> = iter
-                    .map(|item| {
-                        let mut hasher = self.build_hasher.build_hasher();
-                        item.hash(&mut hasher);
-                        hasher.finish() as u32
-                    })
-                    .collect::<Vec<_>>();
-
-                match hashes.len() {
-                    len if len > 0 => self
-                        .a
-                        .iter()
-                        .zip(self.b.iter())
-                        .map(|ab| {
-                            let h = hashes
-                                .iter()
-                                .map(|hash| {
-                                    hash.wrapping_mul(*ab.0).wrapping_add(*ab.1) % MERSENNE_PRIME_31
-                                })
-                                .min()
-                                .unwrap();
-                            h as $type
-                        })
-                        .collect(),
-                    _ => vec![0; self.num_hashes],
-                }
+                self.signature_from_hashes(iter.map(|item| self.hash_token(item)))
+            }
+
+            fn create_signature_from_hashes<T>(&self, hashes: T) -> Vec<Self::V>
+                where
+                    T: Iterator<Item = u32>
+            {
+                self.signature_from_hashes(hashes)
+            }
+
+            fn create_signature_batch<I, T, U>(&self, batch: I) -> Vec<Vec<Self::V>>
+                where
+                    I: Iterator<Item = T>,
+                    T: Iterator<Item = U>,
+                    U: Hash
+            {
+                let batch: Vec<Vec<u32>> = batch.map(|iter| self.hash_tokens(iter)).collect();
+                self.signature_batch_from_hashes(&batch)
+            }
+
+            fn create_signature_batch_from_hashes<I, T>(&self, batch: I) -> Vec<Vec<Self::V>>
+                where
+                    I: Iterator<Item = T>,
+                    T: Iterator<Item = u32>
+            {
+                let batch: Vec<Vec<u32>> = batch.map(|hashes| hashes.collect()).collect();
+                self.signature_batch_from_hashes(&batch)
             }
         }
     }
@@ -103,11 +159,228 @@ macro_rules! make_min_hasher {
 
 const MERSENNE_PRIME_31: u32 = (1 << 31) - 1;
 
+/// Number of token hashes `create_signature` buffers on the stack.
+const HASH_BUFFER_LEN: usize = 256;
+
+/// Coefficients of `num_hashes` hash functions `(a * hash + b) % MERSENNE_PRIME_31`.
+fn coefficients_31(rng: &mut StdRng, num_hashes: usize) -> (Vec<u32>, Vec<u32>) {
+    let rand_range1 = Uniform::from(1..MERSENNE_PRIME_31);
+    let rand_range2 = Uniform::from(0..MERSENNE_PRIME_31);
+    let a = (0..num_hashes).map(|_| rand_range1.sample(rng)).collect();
+    let b = (0..num_hashes).map(|_| rand_range2.sample(rng)).collect();
+    (a, b)
+}
+
+/// Coefficients of `num_hashes` hash functions `(a * hash + b) % 2^16` with odd `a`.
+fn coefficients_16(rng: &mut StdRng, num_hashes: usize) -> (Vec<u16>, Vec<u16>) {
+    let a = (0..num_hashes).map(|_| rng.gen::<u16>() | 1).collect();
+    let b = (0..num_hashes).map(|_| rng.gen::<u16>()).collect();
+    (a, b)
+}
+
+#[cfg(target_arch = "x86")]
+use std::arch::x86::*;
+#[cfg(target_arch = "x86_64")]
+use std::arch::x86_64::*;
+
+/// Computes `min_hashes[i] = min(min_hashes[i], (hash * a[i] + b[i]) % MERSENNE_PRIME_31)` over all `hashes`,
+/// so the hashes of a document can be processed in several calls. Uses AVX2 when the cpu supports it.
+#[inline]
+fn compute_min_hashes(hashes: &[u32], a: &[u32], b: &[u32], min_hashes: &mut [u32]) {
+    #[cfg(any(target_arch = "x86", target_arch = "x86_64"))]
+    {
+        if is_x86_feature_detected!("avx2") {
+            return unsafe { compute_min_hashes_avx2(hashes, a, b, min_hashes) };
+        }
+    }
+    compute_min_hashes_scalar(hashes, a, b, min_hashes)
+}
+
+/// Same as [`compute_min_hashes`] for a batch of documents. Documents without hashes are skipped.
+#[inline]
+fn compute_min_hashes_batch(batch: &[Vec<u32>], a: &[u32], b: &[u32], min_hashes: &mut [Vec<u32>]) {
+    #[cfg(any(target_arch = "x86", target_arch = "x86_64"))]
+    {
+        if is_x86_feature_detected!("avx2") {
+            return unsafe { compute_min_hashes_batch_avx2(batch, a, b, min_hashes) };
+        }
+    }
+    for (hashes, min_hashes) in batch.iter().zip(min_hashes.iter_mut()) {
+        if !hashes.is_empty() {
+            compute_min_hashes_scalar(hashes, a, b, min_hashes);
+        }
+    }
+}
+
+fn compute_min_hashes_scalar(hashes: &[u32], a: &[u32], b: &[u32], min_hashes: &mut [u32]) {
+    for (min_hash, (a, b)) in min_hashes.iter_mut().zip(a.iter().zip(b.iter())) {
+        *min_hash = hashes
+            .iter()
+            .map(|hash| hash.wrapping_mul(*a).wrapping_add(*b) % MERSENNE_PRIME_31)
+            .fold(*min_hash, std::cmp::min);
+    }
+}
+
+/// Applies the 8 hash functions in `a_lanes` and `b_lanes` to all `hashes` and returns
+/// the minimum of every lane and `min_lanes`.
+#[cfg(any(target_arch = "x86", target_arch = "x86_64"))]
+#[inline]
+#[target_feature(enable = "avx2")]
+unsafe fn min_hash_lanes_avx2(hashes: &[u32], a_lanes: __m256i, b_lanes: __m256i, mut min_lanes: __m256i) -> __m256i {
+    let prime = _mm256_set1_epi32(MERSENNE_PRIME_31 as i32);
+    for hash in hashes {
+        let h = _mm256_mullo_epi32(_mm256_set1_epi32(*hash as i32), a_lanes);
+        let h = _mm256_add_epi32(h, b_lanes);
+        // h mod (2^31 - 1) is (h & p) + (h >> 31), minus p when the sum is not less than p.
+        // When the sum is less than p the subtraction wraps around and min keeps the sum.
+        let h = _mm256_add_epi32(_mm256_and_si256(h, prime), _mm256_srli_epi32(h, 31));
+        let h = _mm256_min_epu32(h, _mm256_sub_epi32(h, prime));
+        min_lanes = _mm256_min_epu32(min_lanes, h);
+    }
+    min_lanes
+}
+
+/// Processes 8 hash functions at a time. The minimum of every lane is kept in a register
+/// while iterating over `hashes`, so `min_hashes` is written once.
+#[cfg(any(target_arch = "x86", target_arch = "x86_64"))]
+#[target_feature(enable = "avx2")]
+unsafe fn compute_min_hashes_avx2(hashes: &[u32], a: &[u32], b: &[u32], min_hashes: &mut [u32]) {
+    let simd_len = min_hashes.len() - min_hashes.len() % 8;
+    for i in (0..simd_len).step_by(8) {
+        let a_lanes = _mm256_loadu_si256(a.as_ptr().add(i) as *const __m256i);
+        let b_lanes = _mm256_loadu_si256(b.as_ptr().add(i) as *const __m256i);
+        let min_lanes = _mm256_loadu_si256(min_hashes.as_ptr().add(i) as *const __m256i);
+        let min_lanes = min_hash_lanes_avx2(hashes, a_lanes, b_lanes, min_lanes);
+        _mm256_storeu_si256(min_hashes.as_mut_ptr().add(i) as *mut __m256i, min_lanes);
+    }
+    compute_min_hashes_scalar(hashes, &a[simd_len..], &b[simd_len..], &mut min_hashes[simd_len..]);
+}
+
+/// Loads every block of 8 hash functions once and applies it to all documents of the batch,
+/// so short documents do not pay for reloading the coefficients.
+#[cfg(any(target_arch = "x86", target_arch = "x86_64"))]
+#[target_feature(enable = "avx2")]
+unsafe fn compute_min_hashes_batch_avx2(batch: &[Vec<u32>], a: &[u32], b: &[u32], min_hashes: &mut [Vec<u32>]) {
+    let simd_len = a.len() - a.len() % 8;
+    for i in (0..simd_len).step_by(8) {
+        let a_lanes = _mm256_loadu_si256(a.as_ptr().add(i) as *const __m256i);
+        let b_lanes = _mm256_loadu_si256(b.as_ptr().add(i) as *const __m256i);
+        for (hashes, min_hashes) in batch.iter().zip(min_hashes.iter_mut()) {
+            if !hashes.is_empty() {
+                let min_lanes = _mm256_loadu_si256(min_hashes.as_ptr().add(i) as *const __m256i);
+                let min_lanes = min_hash_lanes_avx2(hashes, a_lanes, b_lanes, min_lanes);
+                _mm256_storeu_si256(min_hashes.as_mut_ptr().add(i) as *mut __m256i, min_lanes);
+            }
+        }
+    }
+    for (hashes, min_hashes) in batch.iter().zip(min_hashes.iter_mut()) {
+        if !hashes.is_empty() {
+            compute_min_hashes_scalar(hashes, &a[simd_len..], &b[simd_len..], &mut min_hashes[simd_len..]);
+        }
+    }
+}
+
+
+/// Folds a 32 bit token hash to the 16 bits hashed by [`compute_min_hashes_16`].
+#[inline]
+fn fold_hash_16(hash: u32) -> u16 {
+    (hash ^ (hash >> 16)) as u16
+}
+
+/// Computes `min_hashes[i] = min(min_hashes[i], (fold(hash) * a[i] + b[i]) % 2^16)` over all `hashes`,
+/// in 16 bit wrapping arithmetic, so AVX2 processes 16 hash functions at a time.
+#[inline]
+fn compute_min_hashes_16(hashes: &[u32], a: &[u16], b: &[u16], min_hashes: &mut [u16]) {
+    #[cfg(any(target_arch = "x86", target_arch = "x86_64"))]
+    {
+        if is_x86_feature_detected!("avx2") {
+            return unsafe { compute_min_hashes_16_avx2(hashes, a, b, min_hashes) };
+        }
+    }
+    compute_min_hashes_16_scalar(hashes, a, b, min_hashes)
+}
 
+/// Same as [`compute_min_hashes_16`] for a batch of documents. Documents without hashes are skipped.
+#[inline]
+fn compute_min_hashes_batch_16(batch: &[Vec<u32>], a: &[u16], b: &[u16], min_hashes: &mut [Vec<u16>]) {
+    #[cfg(any(target_arch = "x86", target_arch = "x86_64"))]
+    {
+        if is_x86_feature_detected!("avx2") {
+            return unsafe { compute_min_hashes_batch_16_avx2(batch, a, b, min_hashes) };
+        }
+    }
+    for (hashes, min_hashes) in batch.iter().zip(min_hashes.iter_mut()) {
+        if !hashes.is_empty() {
+            compute_min_hashes_16_scalar(hashes, a, b, min_hashes);
+        }
+    }
+}
 
-make_min_hasher!(MinHasher32, u32);
-make_min_hasher!(MinHasher16, u16);
-make_min_hasher!(MinHasher8, u8);
+fn compute_min_hashes_16_scalar(hashes: &[u32], a: &[u16], b: &[u16], min_hashes: &mut [u16]) {
+    for (min_hash, (a, b)) in min_hashes.iter_mut().zip(a.iter().zip(b.iter())) {
+        *min_hash = hashes
+            .iter()
+            .map(|hash| fold_hash_16(*hash).wrapping_mul(*a).wrapping_add(*b))
+            .fold(*min_hash, std::cmp::min);
+    }
+}
+
+/// Applies the 16 hash functions in `a_lanes` and `b_lanes` to all `hashes` and returns
+/// the minimum of every lane and `min_lanes`.
+#[cfg(any(target_arch = "x86", target_arch = "x86_64"))]
+#[inline]
+#[target_feature(enable = "avx2")]
+unsafe fn min_hash_lanes_16_avx2(hashes: &[u32], a_lanes: __m256i, b_lanes: __m256i, mut min_lanes: __m256i) -> __m256i {
+    for hash in hashes {
+        let h = _mm256_mullo_epi16(_mm256_set1_epi16(fold_hash_16(*hash) as i16), a_lanes);
+        min_lanes = _mm256_min_epu16(min_lanes, _mm256_add_epi16(h, b_lanes));
+    }
+    min_lanes
+}
+
+#[cfg(any(target_arch = "x86", target_arch = "x86_64"))]
+#[target_feature(enable = "avx2")]
+unsafe fn compute_min_hashes_16_avx2(hashes: &[u32], a: &[u16], b: &[u16], min_hashes: &mut [u16]) {
+    let simd_len = min_hashes.len() - min_hashes.len() % 16;
+    for i in (0..simd_len).step_by(16) {
+        let a_lanes = _mm256_loadu_si256(a.as_ptr().add(i) as *const __m256i);
+        let b_lanes = _mm256_loadu_si256(b.as_ptr().add(i) as *const __m256i);
+        let min_lanes = _mm256_loadu_si256(min_hashes.as_ptr().add(i) as *const __m256i);
+        let min_lanes = min_hash_lanes_16_avx2(hashes, a_lanes, b_lanes, min_lanes);
+        _mm256_storeu_si256(min_hashes.as_mut_ptr().add(i) as *mut __m256i, min_lanes);
+    }
+    compute_min_hashes_16_scalar(hashes, &a[simd_len..], &b[simd_len..], &mut min_hashes[simd_len..]);
+}
+
+#[cfg(any(target_arch = "x86", target_arch = "x86_64"))]
+#[target_feature(enable = "avx2")]
+unsafe fn compute_min_hashes_batch_16_avx2(batch: &[Vec<u32>], a: &[u16], b: &[u16], min_hashes: &mut [Vec<u16>]) {
+    let simd_len = a.len() - a.len() % 16;
+    for i in (0..simd_len).step_by(16) {
+        let a_lanes = _mm256_loadu_si256(a.as_ptr().add(i) as *const __m256i);
+        let b_lanes = _mm256_loadu_si256(b.as_ptr().add(i) as *const __m256i);
+        for (hashes, min_hashes) in batch.iter().zip(min_hashes.iter_mut()) {
+            if !hashes.is_empty() {
+                let min_lanes = _mm256_loadu_si256(min_hashes.as_ptr().add(i) as *const __m256i);
+                let min_lanes = min_hash_lanes_16_avx2(hashes, a_lanes, b_lanes, min_lanes);
+                _mm256_storeu_si256(min_hashes.as_mut_ptr().add(i) as *mut __m256i, min_lanes);
+            }
+        }
+    }
+    for (hashes, min_hashes) in batch.iter().zip(min_hashes.iter_mut()) {
+        if !hashes.is_empty() {
+            compute_min_hashes_16_scalar(hashes, &a[simd_len..], &b[simd_len..], &mut min_hashes[simd_len..]);
+        }
+    }
+}
+
+
+make_min_hasher!(MinHasher32, u32, u32, coefficients_31, compute_min_hashes, compute_min_hashes_batch);
+// 16 and 8 bit signatures are computed with 16 bit hash functions, twice as many lanes as 32 bit.
+// The token hashes are folded to 16 bits, so the similarity of documents with many thousands of
+// distinct tokens is slightly overestimated.
+make_min_hasher!(MinHasher16, u16, u16, coefficients_16, compute_min_hashes_16, compute_min_hashes_batch_16);
+make_min_hasher!(MinHasher8, u8, u16, coefficients_16, compute_min_hashes_16, compute_min_hashes_batch_16);
 
 
 
@@ -115,12 +388,16 @@ make_min_hasher!(MinHasher8, u8);
 mod tests {
     use crate::minhash::{compute_jaccard_similarity, MinHasher};
     use crate::minhash::compute_minhash_similarity;
-    use crate::text::whitespace_split;
+    use crate::text::{rolling_shingle_text, shingle_text, whitespace_split};
     use std::cmp::min;
     use std::f64;
     use crate::minhash::min_hasher::MinHasher16;
     use crate::minhash::min_hasher::MinHasher8;
     use crate::minhash::min_hasher::MinHasher32;
+    use super::{compute_min_hashes, compute_min_hashes_16, compute_min_hashes_16_scalar, compute_min_hashes_scalar,
+                MERSENNE_PRIME_31};
+    use rand::{Rng, SeedableRng};
+    use rand::rngs::StdRng;
 
     static S1: &'static str = "local sensitive hashing is cool";
     static S2: &'static str = "local sensitive hashing is great";
@@ -147,6 +424,75 @@ mod tests {
         test_min_hash(&min_hash);
     }
 
+    #[test]
+    fn test_min_hash_from_rolling_hashes() {
+        let min_hash = MinHasher32::new(128);
+        let s1 = min_hash.create_signature_from_hashes(rolling_shingle_text(S10, 3));
+        let s2 = min_hash.create_signature_from_hashes(rolling_shingle_text(S11, 3));
+        let similarity = compute_minhash_similarity(&s1, &s2) as f32;
+        let actual_similarity = compute_jaccard_similarity(shingle_text(S10, 3), shingle_text(S11, 3));
+        assert!(f32::abs(similarity - actual_similarity) < 0.15);
+    }
+
+    #[test]
+    fn test_compute_min_hashes() {
+        let mut rng = StdRng::seed_from_u64(7);
+        for num_hashes in [1, 7, 8, 9, 100, 128] {
+            let a: Vec<u32> = (0..num_hashes).map(|_| rng.gen_range(1..MERSENNE_PRIME_31)).collect();
+            let b: Vec<u32> = (0..num_hashes).map(|_| rng.gen_range(0..MERSENNE_PRIME_31)).collect();
+            let mut hashes: Vec<u32> = (0..100).map(|_| rng.gen()).collect();
+            hashes.extend_from_slice(&[0, MERSENNE_PRIME_31, 1 << 31, u32::MAX]);
+
+            let mut expected = vec![u32::MAX; num_hashes];
+            compute_min_hashes_scalar(&hashes, &a, &b, &mut expected);
+            let mut actual = vec![u32::MAX; num_hashes];
+            compute_min_hashes(&hashes, &a, &b, &mut actual);
+            assert_eq!(expected, actual);
+
+            let mut chunked = vec![u32::MAX; num_hashes];
+            for chunk in hashes.chunks(17) {
+                compute_min_hashes(chunk, &a, &b, &mut chunked);
+            }
+            assert_eq!(expected, chunked);
+        }
+    }
+
+    #[test]
+    fn test_compute_min_hashes_16() {
+        let mut rng = StdRng::seed_from_u64(7);
+        for num_hashes in [1, 15, 16, 17, 100, 128] {
+            let a: Vec<u16> = (0..num_hashes).map(|_| rng.gen::<u16>() | 1).collect();
+            let b: Vec<u16> = (0..num_hashes).map(|_| rng.gen()).collect();
+            let mut hashes: Vec<u32> = (0..100).map(|_| rng.gen()).collect();
+            hashes.extend_from_slice(&[0, 1 << 16, 1 << 31, u32::MAX]);
+
+            let mut expected = vec![u16::MAX; num_hashes];
+            compute_min_hashes_16_scalar(&hashes, &a, &b, &mut expected);
+            let mut actual = vec![u16::MAX; num_hashes];
+            compute_min_hashes_16(&hashes, &a, &b, &mut actual);
+            assert_eq!(expected, actual);
+        }
+    }
+
+    #[test]
+    fn test_create_signature_batch() {
+        let min_hash = MinHasher32::new(100);
+        // longer than the buffer of create_signature
+        let long_doc = (0..1000).map(|i| i.to_string()).collect::<Vec<_>>().join(" ");
+        let docs = [S1, "", S3, S10, S11, long_doc.as_str()];
+        let expected: Vec<_> = docs.iter()
+            .map(|doc| min_hash.create_signature(whitespace_split(doc)))
+            .collect();
+        let actual = min_hash.create_signature_batch(docs.iter().map(|doc| whitespace_split(doc)));
+        assert_eq!(expected, actual);
+
+        let min_hash = MinHasher16::new(100);
+        let expected: Vec<_> = docs.iter()
+            .map(|doc| min_hash.create_signature(whitespace_split(doc)))
+            .collect();
+        let actual = min_hash.create_signature_batch(docs.iter().map(|doc| whitespace_split(doc)));
+        assert_eq!(expected, actual);
+    }
 
     fn test_min_hash<M: MinHasher>(min_hash: &M) {
         let similarity = min_hash.compute_similarity(whitespace_split(S10), whitespace_split(S11)) as f32;
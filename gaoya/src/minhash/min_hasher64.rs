@@ -58,6 +58,23 @@ impl<B: BuildHasher> MinHasher64V1<B> {
         self.num_hashes
     }
 
+    fn signature_from_hashes(&self, hashes: &[u64]) -> Vec<u64> {
+        match hashes.len() {
+            len if len > 0 => self
+                .a.iter()
+                .zip(self.b.iter())
+                .map(|ab| {
+                    hashes
+                        .iter()
+                        .map(|hash| hash.wrapping_mul(*ab.0).wrapping_add(*ab.1) % MERSENNE_PRIME)
+                        .min()
+                        .unwrap()
+                })
+                .collect(),
+            _ => vec![0; self.num_hashes],
+        }
+    }
+
     fn get_min_hashes_into_vec<T, U>(&self, iter: T, ret: &mut[u64])
     where
         T: Iterator<Item = U>,
@@ -101,21 +118,14 @@ impl<B: BuildHasher> MinHasher for MinHasher64V1<B> {
                 hasher.finish()
             })
             .collect::<Vec<_>>();
+        self.signature_from_hashes(&hashes)
+    }
 
-        match hashes.len() {
-            len if len > 0 => self
-                .a.iter()
-                .zip(self.b.iter())
-                .map(|ab| {
-                    hashes
-                        .iter()
-                        .map(|hash| hash.wrapping_mul(*ab.0).wrapping_add(*ab.1) % MERSENNE_PRIME)
-                        .min()
-                        .unwrap()
-                })
-                .collect(),
-            _ => vec![0; self.num_hashes],
-        }
+    fn create_signature_from_hashes<T>(&self, hashes: T) -> Vec<u64>
+    where
+        T: Iterator<Item = u32>,
+    {
+        self.signature_from_hashes(&hashes.map(|hash| hash as u64).collect::<Vec<_>>())
     }
 
 }
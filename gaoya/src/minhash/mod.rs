@@ -1,6 +1,7 @@
 mod hashers;
 mod min_hasher;
 mod min_hasher64;
+mod one_permutation_hasher;
 
 mod minhash_index;
 mod string_index;
@@ -14,6 +15,10 @@ pub use self::min_hasher64::MinHasher64V1;
 pub use self::min_hasher::MinHasher8;
 pub use self::min_hasher::MinHasher16;
 pub use self::min_hasher::MinHasher32;
+pub use self::one_permutation_hasher::OnePermutationHasher8;
+pub use self::one_permutation_hasher::OnePermutationHasher16;
+pub use self::one_permutation_hasher::OnePermutationHasher32;
+pub use self::one_permutation_hasher::OnePermutationHasher64;
 pub use self::minhash_index::MinHashIndex;
 pub use self::string_index::MinHashStringIndex;
 pub use self::id_container::IdContainer;
@@ -27,16 +32,72 @@ use num_traits::{AsPrimitive, PrimInt};
 use rayon::prelude::*;
 
 /// MinHashType can be any integer.
-pub trait MinHashType: Hash + Send + Sync + PrimInt {}
+pub trait MinHashType: Hash + Send + Sync + PrimInt {
+    /// Returns the number of positions at which two signatures hold the same hash.
+    #[inline]
+    fn count_equal(min_hashes_1: &[Self], min_hashes_2: &[Self]) -> usize {
+        min_hashes_1
+            .iter()
+            .zip(min_hashes_2.iter())
+            .filter(|(min_hash_1, min_hash_2)| min_hash_1 == min_hash_2)
+            .count()
+    }
+}
 impl MinHashType for u64 {}
 impl MinHashType for u32 {}
 impl MinHashType for u16 {}
-impl MinHashType for u8 {}
+impl MinHashType for u8 {
+    #[inline]
+    fn count_equal(min_hashes_1: &[Self], min_hashes_2: &[Self]) -> usize {
+        count_equal_u8(min_hashes_1, min_hashes_2)
+    }
+}
 impl MinHashType for i64 {}
 impl MinHashType for i32 {}
 impl MinHashType for i16 {}
 impl MinHashType for i8 {}
 
+#[inline]
+fn count_equal_u8(min_hashes_1: &[u8], min_hashes_2: &[u8]) -> usize {
+    let len = min_hashes_1.len().min(min_hashes_2.len());
+    #[cfg(any(target_arch = "x86", target_arch = "x86_64"))]
+    {
+        if is_x86_feature_detected!("avx2") {
+            return unsafe { count_equal_u8_avx2(&min_hashes_1[..len], &min_hashes_2[..len]) };
+        }
+    }
+    count_equal_u8_scalar(&min_hashes_1[..len], &min_hashes_2[..len])
+}
+
+#[inline]
+fn count_equal_u8_scalar(min_hashes_1: &[u8], min_hashes_2: &[u8]) -> usize {
+    min_hashes_1
+        .iter()
+        .zip(min_hashes_2.iter())
+        .filter(|(min_hash_1, min_hash_2)| min_hash_1 == min_hash_2)
+        .count()
+}
+
+/// Compares 32 hashes at a time with `_mm256_cmpeq_epi8` and counts the equal
+/// bytes in the movemask.
+#[cfg(any(target_arch = "x86", target_arch = "x86_64"))]
+#[target_feature(enable = "avx2")]
+unsafe fn count_equal_u8_avx2(min_hashes_1: &[u8], min_hashes_2: &[u8]) -> usize {
+    #[cfg(target_arch = "x86")]
+    use std::arch::x86::*;
+    #[cfg(target_arch = "x86_64")]
+    use std::arch::x86_64::*;
+
+    let simd_len = min_hashes_1.len() - min_hashes_1.len() % 32;
+    let mut count = 0;
+    for i in (0..simd_len).step_by(32) {
+        let a = _mm256_loadu_si256(min_hashes_1.as_ptr().add(i) as *const __m256i);
+        let b = _mm256_loadu_si256(min_hashes_2.as_ptr().add(i) as *const __m256i);
+        count += (_mm256_movemask_epi8(_mm256_cmpeq_epi8(a, b)) as u32).count_ones() as usize;
+    }
+    count + count_equal_u8_scalar(&min_hashes_1[simd_len..], &min_hashes_2[simd_len..])
+}
+
 
 
 
@@ -51,6 +112,37 @@ pub trait MinHasher {
             T: Iterator<Item=U>,
             U: Hash;
 
+    /// Creates signature from precomputed 32 bit token hashes (fingerprints), such as
+    /// produced by [`rolling_shingle_text`](crate::text::rolling_shingle_text).
+    /// The default implementation hashes the fingerprints as regular tokens,
+    /// minhashers override it to feed fingerprints directly into the signature.
+    fn create_signature_from_hashes<T>(&self, hashes: T) -> Vec<Self::V>
+        where
+            T: Iterator<Item=u32> {
+        self.create_signature(hashes)
+    }
+
+    /// Creates signatures of a batch of documents.
+    /// The default implementation creates every signature separately, minhashers override it
+    /// to apply every block of hash functions to all documents of the batch before moving
+    /// on to the next block.
+    fn create_signature_batch<I, T, U>(&self, batch: I) -> Vec<Vec<Self::V>>
+        where
+            I: Iterator<Item=T>,
+            T: Iterator<Item=U>,
+            U: Hash {
+        batch.map(|iter| self.create_signature(iter)).collect()
+    }
+
+    /// Same as [`create_signature_batch`](MinHasher::create_signature_batch)
+    /// for documents given as precomputed 32 bit token hashes.
+    fn create_signature_batch_from_hashes<I, T>(&self, batch: I) -> Vec<Vec<Self::V>>
+        where
+            I: Iterator<Item=T>,
+            T: Iterator<Item=u32> {
+        batch.map(|hashes| self.create_signature_from_hashes(hashes)).collect()
+    }
+
     fn bulk_create_signature<U>(&self, batch: &Vec<Vec<U>>) -> Vec<Vec<Self::V>>
         where
             U: Hash + Sync,
@@ -129,6 +221,14 @@ pub fn compute_minhash_similarity<T>(min_hashes_1: &[T], min_hashes_2: &[T]) ->
     (matches as f64) / (num_hashes as f64)
 }
 
+/// Same as [`compute_minhash_similarity`], but compares the signatures with
+/// [`MinHashType::count_equal`], which is vectorized for 8 bit signatures.
+#[inline]
+pub fn compute_signature_similarity<T: MinHashType>(min_hashes_1: &[T], min_hashes_2: &[T]) -> f64 {
+    assert_eq!(min_hashes_1.len(), min_hashes_2.len());
+    T::count_equal(min_hashes_1, min_hashes_2) as f64 / min_hashes_1.len() as f64
+}
+
 #[inline]
 pub fn compute_minhash_distance<T>(min_hashes_1: &[T], min_hashes_2: &[T]) -> f64
     where
@@ -290,9 +390,23 @@ fn calculate_b_and_r(s: f64, n: usize, p: f64) -> (usize, usize) {
 #[cfg(test)]
 mod tests {
     use std::cmp::min;
-    use crate::minhash::{minhash_centroid, compute_minhash_similarity};
+    use crate::minhash::{minhash_centroid, compute_minhash_similarity, compute_signature_similarity};
 
 
+    #[test]
+    fn test_compute_signature_similarity() {
+        for len in [1, 5, 31, 32, 33, 64, 100, 256] {
+            let min_hashes_1: Vec<u8> = (0..len).map(|i| (i * 7) as u8).collect();
+            let min_hashes_2: Vec<u8> = (0..len).map(|i| if i % 3 == 0 { (i * 7) as u8 } else { (i * 5) as u8 }).collect();
+            assert_eq!(compute_minhash_similarity(&min_hashes_1, &min_hashes_2),
+                       compute_signature_similarity(&min_hashes_1, &min_hashes_2));
+            let min_hashes_1: Vec<u32> = min_hashes_1.iter().map(|h| *h as u32).collect();
+            let min_hashes_2: Vec<u32> = min_hashes_2.iter().map(|h| *h as u32).collect();
+            assert_eq!(compute_minhash_similarity(&min_hashes_1, &min_hashes_2),
+                       compute_signature_similarity(&min_hashes_1, &min_hashes_2));
+        }
+    }
+
     #[test]
     fn test_min_hash_centroid() {
         let min_hashes = vec![
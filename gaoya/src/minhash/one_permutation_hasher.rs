@@ -0,0 +1,184 @@
+// One Permutation Hashing with optimal densification
+// One Permutation Hashing https://arxiv.org/abs/1208.1259
+// Optimal Densification for Fast and Accurate Minwise Hashing https://arxiv.org/abs/1703.04664
+
+use std::hash::{BuildHasher, Hash, Hasher};
+use fnv::FnvBuildHasher;
+use crate::minhash::MinHasher;
+
+/// Marks a bin that received no tokens.
+const EMPTY_BIN: u64 = u64::MAX;
+
+/// splitmix64 finalizer
+#[inline]
+fn mix64(mut x: u64) -> u64 {
+    x = (x ^ (x >> 30)).wrapping_mul(0xbf58476d1ce4e5b9);
+    x = (x ^ (x >> 27)).wrapping_mul(0x94d049bb133111eb);
+    x ^ (x >> 31)
+}
+
+/// Maps `hash` to a bin in `0..num_bins` with Lemire's multiply-shift fast range reduction
+/// https://lemire.me/blog/2016/06/27/a-fast-alternative-to-the-modulo-reduction/
+/// instead of an integer division. `num_bins` does not need to be a power of two.
+/// Returns the bin and the low half of the product, which orders the hashes that fall
+/// into the same bin the same way as the hashes themselves. The low bits of the low half
+/// are zero for every factor of two in `num_bins`, so signatures keep its high bits.
+#[inline]
+fn fast_range(hash: u64, num_bins: u64) -> (usize, u64) {
+    let product = (hash as u128) * (num_bins as u128);
+    ((product >> 64) as usize, product as u64)
+}
+
+macro_rules! make_one_permutation_hasher {
+    ($name: ident, $type: ident) => {
+        /// One Permutation Hasher hashes every token once and assigns the hash to one of
+        /// `num_hashes` bins, keeping the minimum hash in each bin. Bins that received
+        /// no tokens are filled by optimal densification, every empty bin copies the value
+        /// of a non-empty bin chosen by a hash of the empty bin index and attempt number.
+        /// The signature has the same layout as the signature of the classic minhasher,
+        /// but costs one hash per token instead of `num_hashes`.
+        pub struct $name<B: BuildHasher> {
+            build_hasher: B,
+            num_hashes: usize
+        }
+
+        impl $name<FnvBuildHasher> {
+            pub fn new(num_hashes: usize) -> Self {
+                return $name::new_with_hasher(num_hashes, FnvBuildHasher::default());
+            }
+        }
+
+        impl<B: BuildHasher> $name<B> {
+            pub fn new_with_hasher(num_hashes: usize, build_hasher: B) -> Self {
+                assert!(num_hashes > 0);
+                $name {
+                    build_hasher,
+                    num_hashes
+                }
+            }
+
+            pub fn num_hashes(&self) -> usize {
+                self.num_hashes
+            }
+
+            fn densify(&self, bins: &[u64]) -> Vec<$type> {
+                let num_bins = self.num_hashes as u64;
+                (0..self.num_hashes)
+                    .map(|i| {
+                        let mut bin = i;
+                        let mut attempt = 0u64;
+                        while bins[bin] == EMPTY_BIN {
+                            attempt += 1;
+                            bin = fast_range(mix64(((i as u64) << 32) | attempt), num_bins).0;
+                        }
+                        (bins[bin] >> (64 - <$type>::BITS)) as $type
+                    })
+                    .collect()
+            }
+        }
+
+        impl<B: BuildHasher> MinHasher for $name<B> {
+            type V = $type;
+            fn create_signature<T, U>(&self, iter: T) -> Vec<Self::V>
+                where
+                    T: Iterator<Item = U>,
+                    U: Hash
+            {
+                let num_bins = self.num_hashes as u64;
+                let mut bins = vec![EMPTY_BIN; self.num_hashes];
+                let mut is_empty = true;
+                for item in iter {
+                    let mut hasher = self.build_hasher.build_hasher();
+                    item.hash(&mut hasher);
+                    let hash = mix64(hasher.finish());
+                    let (bin, value) = fast_range(hash, num_bins);
+                    if value < bins[bin] {
+                        bins[bin] = value;
+                    }
+                    is_empty = false;
+                }
+                match is_empty {
+                    false => self.densify(&bins),
+                    true => vec![0; self.num_hashes],
+                }
+            }
+        }
+    }
+}
+
+make_one_permutation_hasher!(OnePermutationHasher64, u64);
+make_one_permutation_hasher!(OnePermutationHasher32, u32);
+make_one_permutation_hasher!(OnePermutationHasher16, u16);
+make_one_permutation_hasher!(OnePermutationHasher8, u8);
+
+
+#[cfg(test)]
+mod tests {
+    use crate::minhash::{compute_jaccard_similarity, compute_minhash_similarity, MinHasher};
+    use crate::text::whitespace_split;
+    use super::{fast_range, OnePermutationHasher8, OnePermutationHasher16, OnePermutationHasher32,
+                OnePermutationHasher64};
+
+    static S1: &'static str = "local sensitive hashing is cool";
+    static S3: &'static str = "local sensitive hashing is awesome";
+
+    static S10: &'static str = "If you're still searching, we can visit a few open houses together in the next few weeks. It might help give clarity on what you're looking for. What do you think? - Gail's assistant w/eXp Realty";
+    static S11: &'static str = "If you're still searching, we can visit a few open houses together in the next few weeks. It might help give clarity on what you're looking for. What do you think? - Elle's assistant w/Bright Birch Real Estate";
+
+    #[test]
+    fn test_one_permutation_hash() {
+        test_min_hash(&OnePermutationHasher64::new(128));
+        test_min_hash(&OnePermutationHasher32::new(128));
+        test_min_hash(&OnePermutationHasher16::new(128));
+    }
+
+    #[test]
+    fn test_one_permutation_hash_power_of_two_bins() {
+        // with a power of two number of bins the low bits of the in-bin value are zero
+        let docs: Vec<String> = (0..20)
+            .map(|i| (0..50).map(|j| format!("doc{}token{}", i, j)).collect::<Vec<_>>().join(" "))
+            .collect();
+        let min_hash8 = OnePermutationHasher8::new(128);
+        let min_hash16 = OnePermutationHasher16::new(128);
+        for pair in docs.windows(2) {
+            let similarity = compute_minhash_similarity(
+                &min_hash8.create_signature(whitespace_split(&pair[0])),
+                &min_hash8.create_signature(whitespace_split(&pair[1])));
+            assert!(similarity < 0.05, "{}", similarity);
+            let similarity = compute_minhash_similarity(
+                &min_hash16.create_signature(whitespace_split(&pair[0])),
+                &min_hash16.create_signature(whitespace_split(&pair[1])));
+            assert!(similarity < 0.05, "{}", similarity);
+        }
+    }
+
+    #[test]
+    fn test_densification() {
+        let min_hash = OnePermutationHasher32::new(128);
+        // a single token fills one bin, every other bin is densified from it
+        let signature = min_hash.create_signature(["token"].iter());
+        assert!(signature.iter().all(|hash| *hash == signature[0]));
+        assert_eq!(min_hash.create_signature(Vec::<&str>::new().iter()), vec![0; 128]);
+    }
+
+    #[test]
+    fn test_fast_range() {
+        assert_eq!(fast_range(0, 100).0, 0);
+        assert_eq!(fast_range(u64::MAX, 100).0, 99);
+        // hashes within a bin keep their order
+        let (bin_1, value_1) = fast_range(1 << 40, 100);
+        let (bin_2, value_2) = fast_range((1 << 40) + 1, 100);
+        assert_eq!(bin_1, bin_2);
+        assert!(value_1 < value_2);
+    }
+
+    fn test_min_hash<M: MinHasher>(min_hash: &M) {
+        let similarity = min_hash.compute_similarity(whitespace_split(S10), whitespace_split(S11)) as f32;
+        let actual_similarity = compute_jaccard_similarity(whitespace_split(S10), whitespace_split(S11));
+        assert!(f32::abs(similarity - actual_similarity) < 0.15);
+
+        let similarity = min_hash.compute_similarity(whitespace_split(S1), whitespace_split(S3)) as f32;
+        let actual_similarity = compute_jaccard_similarity(whitespace_split(S1), whitespace_split(S3));
+        assert!(f32::abs(similarity - actual_similarity) < 0.15);
+    }
+}
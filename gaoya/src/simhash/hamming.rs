@@ -0,0 +1,167 @@
+// Batched hamming distance filters used to verify SimHash candidates.
+// The AVX2 kernels count bits with the nibble lookup popcount from
+// Faster Population Counts Using AVX2 Instructions https://arxiv.org/abs/1611.07612
+
+use crate::simhash::SimHashBits;
+
+/// Calls `f` with the index of every signature in `signatures` whose hamming distance
+/// to `query` is less than `max_distance`.
+#[inline]
+pub(crate) fn for_each_within_distance_u64<F: FnMut(usize)>(query: u64, signatures: &[u64], max_distance: usize, mut f: F) {
+    #[cfg(any(target_arch = "x86", target_arch = "x86_64"))]
+    {
+        if is_x86_feature_detected!("avx2") {
+            return unsafe { for_each_within_distance_u64_avx2(query, signatures, max_distance, f) };
+        }
+    }
+    for_each_within_distance_scalar(query, signatures, max_distance, 0, &mut f);
+}
+
+/// Calls `f` with the index of every signature in `signatures` whose hamming distance
+/// to `query` is less than `max_distance`.
+#[inline]
+pub(crate) fn for_each_within_distance_u128<F: FnMut(usize)>(query: u128, signatures: &[u128], max_distance: usize, mut f: F) {
+    #[cfg(any(target_arch = "x86", target_arch = "x86_64"))]
+    {
+        if is_x86_feature_detected!("avx2") {
+            return unsafe { for_each_within_distance_u128_avx2(query, signatures, max_distance, f) };
+        }
+    }
+    for_each_within_distance_u128_scalar(query, signatures, max_distance, 0, &mut f);
+}
+
+#[inline]
+fn for_each_within_distance_scalar<S: SimHashBits, F: FnMut(usize)>(query: S, signatures: &[S], max_distance: usize, offset: usize, f: &mut F) {
+    for (i, signature) in signatures.iter().enumerate() {
+        if query.hamming_distance(signature) < max_distance {
+            f(offset + i);
+        }
+    }
+}
+
+/// Counts the low 64 bits first and skips the high 64 bits of signatures
+/// that are already too far from `query`.
+#[inline]
+fn for_each_within_distance_u128_scalar<F: FnMut(usize)>(query: u128, signatures: &[u128], max_distance: usize, offset: usize, f: &mut F) {
+    for (i, signature) in signatures.iter().enumerate() {
+        let diff = query ^ signature;
+        let lo = (diff as u64).count_ones() as usize;
+        if lo >= max_distance {
+            continue;
+        }
+        let hi = ((diff >> 64) as u64).count_ones() as usize;
+        if lo + hi < max_distance {
+            f(offset + i);
+        }
+    }
+}
+
+#[cfg(target_arch = "x86")]
+use std::arch::x86::*;
+#[cfg(target_arch = "x86_64")]
+use std::arch::x86_64::*;
+
+/// Population count of every 64 bit lane using nibble lookup table (Mula, Kurz, Lemire)
+#[cfg(any(target_arch = "x86", target_arch = "x86_64"))]
+#[inline]
+#[target_feature(enable = "avx2")]
+unsafe fn popcount_epi64(x: __m256i) -> __m256i {
+    let lookup = _mm256_setr_epi8(
+        0, 1, 1, 2, 1, 2, 2, 3, 1, 2, 2, 3, 2, 3, 3, 4,
+        0, 1, 1, 2, 1, 2, 2, 3, 1, 2, 2, 3, 2, 3, 3, 4,
+    );
+    let low_mask = _mm256_set1_epi8(0x0f);
+    let lo = _mm256_and_si256(x, low_mask);
+    let hi = _mm256_and_si256(_mm256_srli_epi16(x, 4), low_mask);
+    let counts = _mm256_add_epi8(_mm256_shuffle_epi8(lookup, lo), _mm256_shuffle_epi8(lookup, hi));
+    _mm256_sad_epu8(counts, _mm256_setzero_si256())
+}
+
+#[cfg(any(target_arch = "x86", target_arch = "x86_64"))]
+#[target_feature(enable = "avx2")]
+unsafe fn for_each_within_distance_u64_avx2<F: FnMut(usize)>(query: u64, signatures: &[u64], max_distance: usize, mut f: F) {
+    let simd_len = signatures.len() - signatures.len() % 4;
+    let query_lanes = _mm256_set1_epi64x(query as i64);
+    let max_lanes = _mm256_set1_epi64x(max_distance as i64);
+    for i in (0..simd_len).step_by(4) {
+        let lanes = _mm256_loadu_si256(signatures.as_ptr().add(i) as *const __m256i);
+        let distances = popcount_epi64(_mm256_xor_si256(lanes, query_lanes));
+        let mut mask = _mm256_movemask_pd(_mm256_castsi256_pd(_mm256_cmpgt_epi64(max_lanes, distances)));
+        while mask != 0 {
+            f(i + mask.trailing_zeros() as usize);
+            mask &= mask - 1;
+        }
+    }
+    for_each_within_distance_scalar(query, &signatures[simd_len..], max_distance, simd_len, &mut f);
+}
+
+/// Processes 4 signatures at a time. The low 64 bits of the 4 signatures are counted first,
+/// the high 64 bits are counted only if one of them is still within `max_distance`.
+#[cfg(any(target_arch = "x86", target_arch = "x86_64"))]
+#[target_feature(enable = "avx2")]
+unsafe fn for_each_within_distance_u128_avx2<F: FnMut(usize)>(query: u128, signatures: &[u128], max_distance: usize, mut f: F) {
+    let simd_len = signatures.len() - signatures.len() % 4;
+    let query_lo = _mm256_set1_epi64x(query as i64);
+    let query_hi = _mm256_set1_epi64x((query >> 64) as i64);
+    let max_lanes = _mm256_set1_epi64x(max_distance as i64);
+    for i in (0..simd_len).step_by(4) {
+        // a vector holds two signatures, each as low and high 64 bit lanes
+        let v0 = _mm256_loadu_si256(signatures.as_ptr().add(i) as *const __m256i);
+        let v1 = _mm256_loadu_si256(signatures.as_ptr().add(i + 2) as *const __m256i);
+        // lanes of the signatures i, i + 2, i + 1, i + 3
+        let lo = _mm256_unpacklo_epi64(v0, v1);
+        let lo_counts = popcount_epi64(_mm256_xor_si256(lo, query_lo));
+        if _mm256_movemask_pd(_mm256_castsi256_pd(_mm256_cmpgt_epi64(max_lanes, lo_counts))) == 0 {
+            continue;
+        }
+        let hi = _mm256_unpackhi_epi64(v0, v1);
+        let distances = _mm256_add_epi64(lo_counts, popcount_epi64(_mm256_xor_si256(hi, query_hi)));
+        let mask = _mm256_movemask_pd(_mm256_castsi256_pd(_mm256_cmpgt_epi64(max_lanes, distances)));
+        for (bit, j) in [(0b0001, i), (0b0100, i + 1), (0b0010, i + 2), (0b1000, i + 3)] {
+            if mask & bit != 0 {
+                f(j);
+            }
+        }
+    }
+    for_each_within_distance_u128_scalar(query, &signatures[simd_len..], max_distance, simd_len, &mut f);
+}
+
+#[cfg(test)]
+mod tests {
+    use super::{for_each_within_distance_scalar, for_each_within_distance_u128, for_each_within_distance_u128_scalar,
+                for_each_within_distance_u64};
+    use rand::{thread_rng, Rng};
+
+    #[test]
+    fn test_for_each_within_distance() {
+        let mut rng = thread_rng();
+        for len in [0, 1, 2, 3, 4, 5, 17, 100] {
+            let query: u64 = rng.gen();
+            let signatures: Vec<u64> = (0..len)
+                .map(|i| (0..i % 40).fold(query, |s, _| s ^ (1 << rng.gen_range(0..64))))
+                .collect();
+            for max_distance in [0, 1, 3, 10, 40, 65] {
+                let mut expected = Vec::new();
+                for_each_within_distance_scalar(query, &signatures, max_distance, 0, &mut |i| expected.push(i));
+                let mut actual = Vec::new();
+                for_each_within_distance_u64(query, &signatures, max_distance, |i| actual.push(i));
+                assert_eq!(expected, actual);
+            }
+
+            let query: u128 = rng.gen();
+            let signatures: Vec<u128> = (0..len)
+                .map(|i| (0..i % 70).fold(query, |s, _| s ^ (1 << rng.gen_range(0..128))))
+                .collect();
+            for max_distance in [0, 1, 3, 10, 40, 65, 129] {
+                let mut expected = Vec::new();
+                for_each_within_distance_scalar(query, &signatures, max_distance, 0, &mut |i| expected.push(i));
+                let mut actual = Vec::new();
+                for_each_within_distance_u128(query, &signatures, max_distance, |i| actual.push(i));
+                assert_eq!(expected, actual);
+                let mut actual = Vec::new();
+                for_each_within_distance_u128_scalar(query, &signatures, max_distance, 0, &mut |i| actual.push(i));
+                assert_eq!(expected, actual);
+            }
+        }
+    }
+}
@@ -1,3 +1,4 @@
+mod hamming;
 mod permutation;
 mod sim_hash;
 mod sim_hash_index;
@@ -48,6 +49,16 @@ pub trait SimHashBits:
 
     fn hamming_distance(&self, rhs: &Self) -> usize;
 
+    /// Calls `f` with the index of every signature in `signatures` whose hamming distance
+    /// to `self` is less than `max_distance`.
+    fn for_each_within_distance<F: FnMut(usize)>(&self, signatures: &[Self], max_distance: usize, mut f: F) {
+        for (i, signature) in signatures.iter().enumerate() {
+            if self.hamming_distance(signature) < max_distance {
+                f(i);
+            }
+        }
+    }
+
     fn hamming_angle(&self, rhs: &Self) -> f64 {
         self.hamming_distance(rhs) as f64 * (PI /  Self::bit_length() as f64)
     }
@@ -56,7 +67,7 @@ pub trait SimHashBits:
 }
 
 macro_rules! prim_int_impl {
-    ($T:ty, $S:ty, $U:ty) => {
+    ($T:ty, $S:ty, $U:ty, $within_distance:path) => {
         impl SimHashBits for $T {
             #[inline]
             fn count_ones(self) -> usize {
@@ -78,6 +89,11 @@ macro_rules! prim_int_impl {
                 (self ^ rhs).count_ones() as usize
             }
 
+            #[inline]
+            fn for_each_within_distance<F: FnMut(usize)>(&self, signatures: &[Self], max_distance: usize, f: F) {
+                $within_distance(*self, signatures, max_distance, f)
+            }
+
             #[inline]
             fn bit_length() -> usize {
                 mem::size_of::<$T>() * 8
@@ -86,5 +102,5 @@ macro_rules! prim_int_impl {
     };
 }
 
-prim_int_impl!(u64, i64, u64);
-prim_int_impl!(u128, i128, u128);
+prim_int_impl!(u64, i64, u64, hamming::for_each_within_distance_u64);
+prim_int_impl!(u128, i128, u128, hamming::for_each_within_distance_u128);
@@ -63,12 +63,7 @@ where
             p.offsets_masks.push((masks[i], offsets[i]))
         }
         p.width = width;
-        for _i in 0..width {
-            p.search_mask = (p.search_mask << 1) | S::one();
-        }
-        for _i in width..type_width {
-            p.search_mask = p.search_mask << 1;
-        }
+        p.search_mask = bit_range_mask(type_width - width, type_width);
         for mask in choice {
             p.simple_mask |= mask;
         }
@@ -83,13 +78,9 @@ where
         let mut blocks = Vec::new();
 
         for i in 0..num_blocks {
-            let mut mask: S = S::zero();
             let start = (i * S::bit_length()) / num_blocks;
             let end = ((i + 1) * S::bit_length()) / num_blocks;
-            for j in start..end {
-                mask |= S::one() << j;
-            }
-            blocks.push(mask);
+            blocks.push(bit_range_mask(start, end));
         }
         let count = num_blocks - diff_bits;
 
@@ -122,9 +113,34 @@ where
     }
 }
 
+/// Returns the mask of bits `start..end`, built with two shifts instead of setting bit by bit.
+#[inline]
+fn bit_range_mask<S: SimHashBits>(start: usize, end: usize) -> S {
+    match end - start {
+        0 => S::zero(),
+        len => (!S::zero() >> (S::bit_length() - len)) << start,
+    }
+}
+
 #[cfg(test)]
 mod tests {
-    use super::Permutation;
+    use super::{bit_range_mask, Permutation};
+
+    #[test]
+    pub fn test_bit_range_mask() {
+        for start in 0..=128 {
+            for end in start..=128 {
+                let mut expected = 0u128;
+                for j in start..end {
+                    expected |= 1 << j;
+                }
+                assert_eq!(bit_range_mask::<u128>(start, end), expected);
+                if end <= 64 {
+                    assert_eq!(bit_range_mask::<u64>(start, end), expected as u64);
+                }
+            }
+        }
+    }
 
     #[test]
     pub fn test_permutations() {
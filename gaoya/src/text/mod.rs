@@ -1,5 +1,6 @@
 mod tokenizers;
 mod multi_shingles;
+mod rolling_hash;
 
 pub use self::tokenizers::whitespace_split;
 pub use self::tokenizers::whitespace_split_boxed;
@@ -9,5 +10,8 @@ pub use self::tokenizers::shingle_text_range;
 pub use self::tokenizers::shingle_text_boxed;
 pub use self::tokenizers::shingle_tokens;
 pub use self::multi_shingles::MultiShingles;
+pub use self::rolling_hash::RollingCharShingles;
+pub use self::rolling_hash::rolling_shingle_text;
+pub use self::rolling_hash::rolling_shingle_text_range;
 
 
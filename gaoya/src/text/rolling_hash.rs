@@ -0,0 +1,113 @@
+use std::str::Chars;
+
+/// Modulus of the rolling hash, the same Mersenne prime used by 32 bit minhashers
+const PRIME: u64 = (1 << 31) - 1;
+const BASE: u64 = 1_000_003;
+
+/// RollingCharShingles produces Rabin-Karp fingerprints of character shingles of a fixed size.
+///
+/// The fingerprint of the shingle `c_1..c_k` is `c_1 * q^(k-1) + ... + c_k mod p`.
+/// The fingerprint of the next shingle is computed from the previous one
+/// as `h * q - c_1 * q^k + c_(k+1) mod p`, so the cost of every shingle is
+/// constant regardless of its size.
+pub struct RollingCharShingles<'a> {
+    head: Chars<'a>,
+    tail: Chars<'a>,
+    base_pow_size: u64,
+    hash: u64,
+    full: bool,
+}
+
+impl<'a> RollingCharShingles<'a> {
+    pub fn new(text: &'a str, size: usize) -> Self {
+        let mut head = text.chars();
+        let mut hash = 0;
+        let mut base_pow_size = 1;
+        let mut len = 0;
+        while len < size {
+            match head.next() {
+                Some(c) => hash = (hash * BASE + c as u64) % PRIME,
+                None => break,
+            }
+            base_pow_size = base_pow_size * BASE % PRIME;
+            len += 1;
+        }
+        RollingCharShingles {
+            head,
+            tail: text.chars(),
+            base_pow_size,
+            hash,
+            full: size > 0 && len == size,
+        }
+    }
+}
+
+impl<'a> Iterator for RollingCharShingles<'a> {
+    type Item = u32;
+
+    #[inline]
+    fn next(&mut self) -> Option<Self::Item> {
+        if !self.full {
+            return None;
+        }
+        let hash = self.hash as u32;
+        match (self.head.next(), self.tail.next()) {
+            (Some(c_in), Some(c_out)) => {
+                self.hash = (self.hash * BASE + c_in as u64) % PRIME;
+                self.hash = (self.hash + PRIME - c_out as u64 * self.base_pow_size % PRIME) % PRIME;
+            }
+            _ => self.full = false,
+        }
+        Some(hash)
+    }
+}
+
+/// Returns fingerprints of character shingles of size `size`
+pub fn rolling_shingle_text<'a>(text: &'a str, size: usize) -> impl Iterator<Item = u32> + 'a {
+    RollingCharShingles::new(text, size)
+}
+
+/// Returns fingerprints of character shingles of every size in range `from..=to`
+pub fn rolling_shingle_text_range<'a>(text: &'a str, from: usize, to: usize) -> impl Iterator<Item = u32> + 'a {
+    (from..=to).flat_map(move |size| RollingCharShingles::new(text, size))
+}
+
+
+#[cfg(test)]
+mod tests {
+    use super::{rolling_shingle_text, rolling_shingle_text_range, BASE, PRIME};
+
+    fn fingerprint(shingle: &[char]) -> u32 {
+        shingle.iter().fold(0u64, |h, c| (h * BASE + *c as u64) % PRIME) as u32
+    }
+
+    #[test]
+    fn test_rolling_hash_matches_fingerprint() {
+        let text = "rolling hash of the text, rölling häsh ✓";
+        let chars: Vec<char> = text.chars().collect();
+        for size in 1..6 {
+            let expected: Vec<u32> = chars.windows(size).map(fingerprint).collect();
+            let actual: Vec<u32> = rolling_shingle_text(text, size).collect();
+            assert_eq!(expected, actual);
+        }
+    }
+
+    #[test]
+    fn test_rolling_hash_short_text() {
+        assert_eq!(rolling_shingle_text("", 3).count(), 0);
+        assert_eq!(rolling_shingle_text("ab", 3).count(), 0);
+        assert_eq!(rolling_shingle_text("abc", 3).count(), 1);
+        assert_eq!(rolling_shingle_text("abc", 0).count(), 0);
+    }
+
+    #[test]
+    fn test_rolling_hash_range() {
+        let text = "abcdef";
+        let actual: Vec<u32> = rolling_shingle_text_range(text, 2, 3).collect();
+        let expected: Vec<u32> = ["ab", "bc", "cd", "de", "ef", "abc", "bcd", "cde", "def"]
+            .iter()
+            .map(|shingle| fingerprint(&shingle.chars().collect::<Vec<_>>()))
+            .collect();
+        assert_eq!(expected, actual);
+    }
+}
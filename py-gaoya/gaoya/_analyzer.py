@@ -0,0 +1,35 @@
+import sys
+from functools import lru_cache
+
+
+def interning(analyzer):
+    """
+    Wraps callable `analyzer`, so that equal tokens are the same interned python string.
+    Bulk methods convert every distinct string object once per batch, so repeated tokens
+    of the corpus are passed to the native index without copying.
+    Raises `TypeError` if `analyzer` returns a `str`, like the native index does for single documents.
+    """
+    intern = sys.intern
+
+    def analyze(doc):
+        tokens = analyzer(doc)
+        if isinstance(tokens, str):
+            raise TypeError("analyzer must return a sequence of strings, not str")
+        return [intern(token) for token in tokens]
+
+    return analyze
+
+
+@lru_cache(maxsize=None)
+def analyzed_class(cls, analyzed):
+    """
+    Returns the class of an index of class `cls` with a callable analyzer. `analyzed` is the private
+    subclass of the index class that tokenizes documents in python. A subclass of the index class
+    is combined with `analyzed`, so the methods the subclass overrides take precedence.
+    """
+    if issubclass(cls, analyzed):
+        return cls
+    if issubclass(analyzed, cls):
+        return analyzed
+    return type(cls.__name__, (cls, analyzed),
+                {'__module__': cls.__module__, '__qualname__': cls.__qualname__, '__doc__': cls.__doc__})
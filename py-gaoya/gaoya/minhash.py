@@ -1,6 +1,45 @@
+from functools import lru_cache
 from typing import List, Union, Tuple
 
 from .gaoya import minhash as m
+from ._analyzer import analyzed_class, interning
+
+# native index class for every (hash_size, id_container)
+_INDEX_CONSTRUCTORS = {
+    (64, 'set'): m.MinHash64StringIntIndexHashSet,
+    (64, 'vec'): m.MinHash64StringIntIndexVec,
+    (64, 'smallvec'): m.MinHash64StringIntIndexSmallVec,
+    (32, 'set'): m.MinHash32StringIntIndexHashSet,
+    (32, 'vec'): m.MinHash32StringIntIndexVec,
+    (32, 'smallvec'): m.MinHash32StringIntIndexSmallVec,
+    (16, 'set'): m.MinHash16StringIntIndexHashSet,
+    (16, 'vec'): m.MinHash16StringIntIndexVec,
+    (16, 'smallvec'): m.MinHash16StringIntIndexSmallVec,
+    (8, 'set'): m.MinHash8StringIntIndexHashSet,
+    (8, 'vec'): m.MinHash8StringIntIndexVec,
+    (8, 'smallvec'): m.MinHash8StringIntIndexSmallVec,
+}
+
+
+@lru_cache(maxsize=64)
+def _optimal_bands(jaccard_threshold: float, num_hashes: int, proba: float = 0.99) -> Tuple[int, int]:
+    """
+    Returns `(num_bands, band_size)` for a signature of `num_hashes` hashes. The band size grows
+    while a pair of documents with similarity `jaccard_threshold` still shares at least one band
+    with probability greater than `proba`, according to the S-curve `1 - (1 - s^r)^b`.
+    Same as `calculate_minhash_params` in the Rust crate, cached for indexes created with the same
+    parameters.
+    """
+    num_bands, band_size = num_hashes, 1
+    while num_bands > 1:
+        next_band_size = band_size + 1
+        next_num_bands = num_hashes // next_band_size
+        if 1.0 - (1.0 - jaccard_threshold ** next_band_size) ** next_num_bands > proba:
+            num_bands, band_size = next_num_bands, next_band_size
+        else:
+            break
+    return num_bands, band_size
+
 
 class MinHashStringIndex:
     """
@@ -16,6 +55,9 @@ class MinHashStringIndex:
     hash_size: int, default=32
         The size of individual hashes in bits in minhash signature. Supported sizes are (16, 32, 64).
         Bigger hashes offer better accuracy, smaller hashes use less memory.
+        8 and 16 bit signatures are computed with 16 bit hash functions, twice as many per instruction as 32 bit.
+        Token hashes are folded to 16 bits, so the similarity of documents with many
+        distinct tokens is slightly overestimated, by about 0.02 for 5000 tokens.
 
     num_bands: int, default=25
         The number of bands
@@ -41,6 +83,8 @@ class MinHashStringIndex:
         If a callable is passed it is used to extract the sequence of features
         out of the raw, unprocessed input. Note, that built-in analyzers are implemented in Rust,
         and generally faster that similar implementation in Python.
+        Bulk methods with 100 or more documents call a callable analyzer from several python threads
+        at the same time, so the analyzer must be thread-safe.
 
     lowercase : bool, default=False
         Convert all characters to lowercase before tokenizing.
@@ -53,13 +97,34 @@ class MinHashStringIndex:
         only bigrams.
         Only applies if `analyzer` is not callable.
 
-    id_container: str, default="set"
+    id_container: str, default="smallvec"
         The data structure used as a bucket to hold ids of documents in bands.
-        When efficient removals required use "set".
-        When removals are not required or rare use "vec"
-        When the number of similar documents (near duplicates) is expected to be small use "smallvec" which
-        can store up to two ids inline without allocation, which reduces memory usage
-        and improves performamance.
+        "smallvec" stores up to two ids inline without allocation, which reduces memory usage
+        and improves performamance when most buckets hold one or two near duplicates. Buckets with
+        more ids spill to the heap.
+        When efficient removals from large buckets are required use "set".
+        When removals are not required or rare and buckets are large use "vec"
+
+    rolling_hash: bool, default=False
+        Hash character n-grams with a Rabin-Karp rolling hash. The hash of every n-gram is
+        computed from the hash of the previous one in constant time, instead of hashing
+        every n-gram from scratch, which makes signatures of long documents with large n cheaper.
+        Signatures produced with and without `rolling_hash` are not compatible.
+        Only applies if `analyzer` is 'char'.
+
+    sketcher: {'minhash', 'oph'}, default='minhash'
+        The algorithm used to create signatures. 'minhash' applies `num_bands` * `band_size`
+        hash functions to every token. 'oph' (One Permutation Hashing with optimal densification)
+        hashes every token once and distributes the hashes into `num_bands` * `band_size` bins,
+        which is much faster for long documents and large signatures, with similar accuracy.
+        The signature layout is the same, but signatures of different sketchers are not compatible.
+
+    n_threads: int, default=None
+        The number of native threads used by the parallel `par_bulk_*` methods. When set the index
+        runs its bulk operations in a dedicated thread pool, so several indexes used concurrently
+        do not oversubscribe the cpu. By default the global thread pool is used, which has one thread
+        per cpu, or `RAYON_NUM_THREADS` threads if the environment variable is set before the first
+        bulk operation.
 
     Examples
     --------
@@ -82,6 +147,13 @@ class MinHashStringIndex:
 
 
 
+    def __new__(cls, *args, **kwargs):
+        # analyzer is the sixth argument of __init__
+        analyzer = kwargs.get('analyzer', args[5] if len(args) > 5 else None)
+        if callable(analyzer):
+            cls = analyzed_class(cls, _AnalyzedMinHashStringIndex)
+        return super().__new__(cls)
+
     def __init__(self, hash_size=32,
                  jaccard_threshold=0.75,
                  num_bands=20,
@@ -90,42 +162,35 @@ class MinHashStringIndex:
                  analyzer='word',
                  lowercase=False,
                  ngram_range=None,
-                 id_container='set'):
+                 id_container='smallvec',
+                 rolling_hash=False,
+                 sketcher='minhash',
+                 n_threads=None):
         if hash_size not in [8, 16, 32, 64]:
             raise ValueError(f"Invalid hash_size {hash_size}. hash_size must be on of 8, 16, 32 or 64")
         if jaccard_threshold < 0.0 or jaccard_threshold > 1.0:
             raise ValueError(f"Jaccard threshold must be between 0 and 1")
         if id_container not in ("set", "vec", "smallvec"):
             raise ValueError(f"id_container must be one of ('set', 'vec', 'smallvec')")
+        if sketcher not in ("minhash", "oph"):
+            raise ValueError(f"sketcher must be one of ('minhash', 'oph')")
         self.analyzer = analyzer
         # if analyzer is callable we need to pass something to index's constructor.
         analyzer = 'word' if callable(self.analyzer) else analyzer
 
-        constructors = {
-            64: {
-                'set': m.MinHash64StringIntIndexHashSet,
-                'vec': m.MinHash64StringIntIndexVec,
-                'smallvec': m.MinHash64StringIntIndexSmallVec,
-            },
-            32: {
-                'set': m.MinHash32StringIntIndexHashSet,
-                'vec': m.MinHash32StringIntIndexVec,
-                'smallvec': m.MinHash32StringIntIndexSmallVec,
-            },
-            16: {
-                'set': m.MinHash16StringIntIndexHashSet,
-                'vec': m.MinHash16StringIntIndexVec,
-                'smallvec': m.MinHash16StringIntIndexSmallVec,
-            },
-            8: {
-                'set': m.MinHash8StringIntIndexHashSet,
-                'vec': m.MinHash8StringIntIndexVec,
-                'smallvec': m.MinHash8StringIntIndexSmallVec,
-            }
-        }
-
-        type = constructors[hash_size][id_container]
-        self.minhash_index = type(jaccard_threshold, num_bands, band_size, num_hashes, analyzer, lowercase, ngram_range)
+        if (num_bands is None or band_size is None) and num_hashes is not None:
+            num_bands, band_size = _optimal_bands(jaccard_threshold, num_hashes)
+
+        type = _INDEX_CONSTRUCTORS[(hash_size, id_container)]
+        self.minhash_index = type(jaccard_threshold, num_bands, band_size, num_hashes, analyzer, lowercase, ngram_range,
+                                  rolling_hash=rolling_hash, sketcher=sketcher, n_threads=n_threads)
+        # bind query methods once to avoid attribute resolution on every query
+        self._query_doc = self.minhash_index.query
+        self._query_doc_sim = self.minhash_index.query_return_similarity
+        self._query_tok = self.minhash_index.query_tokens
+        self._query_tok_sim = self.minhash_index.query_tokens_return_similarity
+        if callable(self.analyzer):
+            self._bulk_analyzer = interning(self.analyzer)
 
     def insert_document(self, id: int, doc: str):
         """
@@ -139,10 +204,7 @@ class MinHashStringIndex:
         doc: str
             Document text
         """
-        if callable(self.analyzer):
-            self.minhash_index.insert_tokens(id, self.analyzer(doc))
-        else:
-            self.minhash_index.insert_document(id, doc)
+        self.minhash_index.insert_document(id, doc)
 
     def query(self, doc: str, return_similarity=False) -> Union[List[int], List[Tuple[int, float]]]:
         """
@@ -151,6 +213,9 @@ class MinHashStringIndex:
         If return_similarity is `True` method returns a list of tuples where the first element
         is document id and the second is jaccard similarity. The result is sorted by similarity from
         highest to lowest.
+        The GIL is released while the document is hashed and searched, so queries from multiple
+        python threads run concurrently. If analyzer is callable only the analyzer holds the GIL.
+        Inserting a document while another thread queries the index raises `RuntimeError`.
 
         Parameters
         ----------
@@ -162,16 +227,7 @@ class MinHashStringIndex:
         ----------
         List of ids or list of tuples
         """
-        if callable(self.analyzer):
-            if return_similarity:
-                return self.minhash_index.query_tokens_return_similarity(self.analyzer(doc))
-            else:
-                return self.minhash_index.query_tokens(self.analyzer(doc))
-        else:
-            if return_similarity:
-                return self.minhash_index.query_return_similarity(doc)
-            else:
-                return self.minhash_index.query(doc)
+        return self._query_doc_sim(doc) if return_similarity else self._query_doc(doc)
 
     def par_bulk_query(self, docs: List[str], return_similarity=False):
         """
@@ -189,25 +245,25 @@ class MinHashStringIndex:
         ----------
         List Lists of ids or list of lists of tuples
         """
-
-        if callable(self.analyzer):
-            analyzed_docs = [self.analyzer(doc) for doc in docs]
+        if len(docs) > 4:
+            # signatures of small batches of documents are computed together,
+            # so the hash function coefficients are loaded once per batch
             if return_similarity:
-                return self.minhash_index.par_bulk_query_tokens_return_similarity(analyzed_docs)
+                return self.minhash_index.par_bulk_query_batched_return_similarity(docs)
             else:
-                return self.minhash_index.par_bulk_query_tokens(analyzed_docs)
+                return self.minhash_index.par_bulk_query_batched(docs)
         else:
             if return_similarity:
                 return self.minhash_index.par_bulk_query_return_similarity(docs)
             else:
                 return self.minhash_index.par_bulk_query(docs)
 
-
-
     def par_bulk_insert_docs(self, ids: List[int], docs: List[str]):
         """
         Inserts a batch of documents. This method will use multiple cores to insert a batch
-        of documents into the index. If analyzer is callable tokenization will be single threaded.
+        of documents into the index. If analyzer is callable documents of large batches are tokenized
+        on a thread pool, and tokenized documents are hashed by native threads while
+        the remaining documents are still being tokenized.
 
         Parameters
         ----------
@@ -217,11 +273,51 @@ class MinHashStringIndex:
         docs: list
             List of strings
         """
-        if callable(self.analyzer):
-            tokens = [self.analyzer(doc) for doc in docs]
-            self.minhash_index.bulk_insert_tokens(ids, tokens)
-        else:
-            self.minhash_index.par_bulk_insert_docs(ids, docs)
+        self.minhash_index.par_bulk_insert_docs(ids, docs)
+
+    def par_bulk_insert_prehashed(self, ids: List[int], hashes, offsets):
+        """
+        Inserts a batch of documents given as precomputed 32 bit token hashes in CSR layout.
+        The tokens of document `ids[i]` are `hashes[offsets[i]:offsets[i + 1]]`.
+        Token hashes are not hashed again, so documents inserted with this method must be
+        queried with `par_bulk_query_prehashed`. Requires numpy.
+
+        Parameters
+        ----------
+        ids: list
+            List of ids
+
+        hashes: array-like of uint32
+            Token hashes of all documents
+
+        offsets: array-like of uint64
+            `len(ids) + 1` offsets of documents in `hashes`
+        """
+        import numpy as np
+        self.minhash_index.par_bulk_insert_token_hashes(
+            ids, np.ascontiguousarray(hashes, dtype=np.uint32), np.ascontiguousarray(offsets, dtype=np.uint64))
+
+    def par_bulk_query_prehashed(self, hashes, offsets):
+        """
+        Searches the index for documents given as precomputed 32 bit token hashes in CSR layout.
+        The tokens of document `i` are `hashes[offsets[i]:offsets[i + 1]]`. Requires numpy.
+
+        Parameters
+        ----------
+        hashes: array-like of uint32
+            Token hashes of all documents
+
+        offsets: array-like of uint64
+            Offsets of documents in `hashes`, one more than the number of documents
+
+        Returns:
+        ----------
+        Tuple of numpy arrays `(ids, offsets)`, the ids similar to document `i`
+        are `ids[offsets[i]:offsets[i + 1]]`
+        """
+        import numpy as np
+        return self.minhash_index.par_bulk_query_token_hashes(
+            np.ascontiguousarray(hashes, dtype=np.uint32), np.ascontiguousarray(offsets, dtype=np.uint64))
 
     def remove(self, id: int):
         """
@@ -245,3 +341,31 @@ class MinHashStringIndex:
 
     def __repr__(self):
         return self.minhash_index.__repr__()
+
+
+class _AnalyzedMinHashStringIndex(MinHashStringIndex):
+    # MinHashStringIndex with a callable analyzer, chosen by MinHashStringIndex.__new__, subclasses
+    # of MinHashStringIndex are combined with it by analyzed_class,
+    # so the methods do not check the analyzer on every call.
+    # Documents are tokenized in python and passed to the native index as tokens.
+    __doc__ = MinHashStringIndex.__doc__
+
+    def insert_document(self, id: int, doc: str):
+        self.minhash_index.insert_tokens(id, self.analyzer(doc))
+
+    def query(self, doc: str, return_similarity=False) -> Union[List[int], List[Tuple[int, float]]]:
+        tokens = self.analyzer(doc)
+        return self._query_tok_sim(tokens) if return_similarity else self._query_tok(tokens)
+
+    def par_bulk_query(self, docs: List[str], return_similarity=False):
+        if return_similarity:
+            return self.minhash_index.par_bulk_query_with_callback_return_similarity(docs, self._bulk_analyzer)
+        else:
+            return self.minhash_index.par_bulk_query_with_callback(docs, self._bulk_analyzer)
+
+    def par_bulk_insert_docs(self, ids: List[int], docs: List[str]):
+        self.minhash_index.par_bulk_insert_docs_with_callback(ids, docs, self._bulk_analyzer)
+
+
+for _name in ('insert_document', 'query', 'par_bulk_query', 'par_bulk_insert_docs'):
+    getattr(_AnalyzedMinHashStringIndex, _name).__doc__ = getattr(MinHashStringIndex, _name).__doc__
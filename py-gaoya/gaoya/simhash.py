@@ -1,6 +1,7 @@
 from typing import List, Union, Tuple
 
 from .gaoya import simhash as s
+from ._analyzer import analyzed_class, interning
 
 class SimHashStringIndex:
     """
@@ -27,6 +28,8 @@ class SimHashStringIndex:
         If a callable is passed it is used to extract the sequence of features
         out of the raw, unprocessed input. Note, that built-in analyzers are implemented in Rust,
         and generally faster that similar implementation in Python.
+        Bulk methods with 100 or more documents call a callable analyzer from several python threads
+        at the same time, so the analyzer must be thread-safe.
 
     lowercase : bool, default=False
         Convert all characters to lowercase before tokenizing.
@@ -38,15 +41,30 @@ class SimHashStringIndex:
         unigrams, `(1, 2)` means unigrams and bigrams, and `(2, 2)` means
         only bigrams.
         Only applies if `analyzer` is not callable.
+
+    n_threads: int, default=None
+        The number of native threads used by the parallel `par_bulk_*` methods. When set the index
+        runs its bulk operations in a dedicated thread pool, so several indexes used concurrently
+        do not oversubscribe the cpu. By default the global thread pool is used, which has one thread
+        per cpu, or `RAYON_NUM_THREADS` threads if the environment variable is set before the first
+        bulk operation.
     """
 
+    def __new__(cls, *args, **kwargs):
+        # analyzer is the fourth argument of __init__
+        analyzer = kwargs.get('analyzer', args[3] if len(args) > 3 else None)
+        if callable(analyzer):
+            cls = analyzed_class(cls, _AnalyzedSimHashStringIndex)
+        return super().__new__(cls)
+
     def __init__(self,
                  hash_size: int=64,
                  num_blocks: int=6,
                  hamming_distance: int=5,
                  analyzer: str='word',
                  lowercase: bool=False,
-                 ngram_range: Tuple=None):
+                 ngram_range: Tuple=None,
+                 n_threads: int=None):
 
         if hash_size not in [64, 128]:
             raise ValueError(f"Invalid hash_size {hash_size}. hash_size must be one of of 64 or 128")
@@ -61,9 +79,18 @@ class SimHashStringIndex:
         # if analyzer is callable we need to pass something to index's constructor.
         analyzer = 'word' if callable(self.analyzer) else analyzer
         if hash_size == 64:
-            self.index = s.SimHash64StringIntIndex(num_blocks, hamming_distance, analyzer, lowercase, ngram_range)
+            self.index = s.SimHash64StringIntIndex(num_blocks, hamming_distance, analyzer, lowercase, ngram_range,
+                                                   n_threads=n_threads)
         else:
-            self.index = s.SimHash128StringIntIndex(num_blocks, hamming_distance, analyzer, lowercase, ngram_range)
+            self.index = s.SimHash128StringIntIndex(num_blocks, hamming_distance, analyzer, lowercase, ngram_range,
+                                                    n_threads=n_threads)
+        # bind query methods once to avoid attribute resolution on every query
+        self._query_doc = self.index.query
+        self._query_doc_dist = self.index.query_return_distance
+        self._query_tok = self.index.query_tokens
+        self._query_tok_dist = self.index.query_tokens_return_distance
+        if callable(self.analyzer):
+            self._bulk_analyzer = interning(self.analyzer)
 
 
     def insert_document(self, id, doc):
@@ -77,10 +104,7 @@ class SimHashStringIndex:
         doc: str
             Document text
         """
-        if callable(self.analyzer):
-            self.index.insert_tokens(id, self.analyzer(doc))
-        else:
-            self.index.insert_document(id, doc)
+        self.index.insert_document(id, doc)
 
     def query(self, doc: str, return_hamming_distance=False) -> Union[List[int], List[Tuple[int, int]]]:
         """
@@ -89,6 +113,9 @@ class SimHashStringIndex:
         If return_similarity is `True` method returns a list of tuples where the first element
         is document id and the second is hamming distance. The result is sorted by hamming distance
         from lowest to highest
+        The GIL is released while the document is hashed and searched, so queries from multiple
+        python threads run concurrently. If analyzer is callable only the analyzer holds the GIL.
+        Inserting a document while another thread queries the index raises `RuntimeError`.
 
         Parameters
         ----------
@@ -100,16 +127,7 @@ class SimHashStringIndex:
         ----------
         List of ids or list of tuples
         """
-        if callable(self.analyzer):
-            if return_hamming_distance:
-                return self.index.query_tokens_return_similarity(self.analyzer(doc))
-            else:
-                return self.index.query_tokens(self.analyzer(doc))
-        else:
-            if return_hamming_distance:
-                return self.index.query_return_similarity(doc)
-            else:
-                return self.index.query(doc)
+        return self._query_doc_dist(doc) if return_hamming_distance else self._query_doc(doc)
 
     def par_bulk_query(self, docs: List[str], return_similarity=False):
         """
@@ -128,15 +146,32 @@ class SimHashStringIndex:
         ----------
         List Lists of ids or list of lists of tuples
         """
+        if return_similarity:
+            return self.index.par_bulk_query_return_distance(docs)
+        else:
+            return self.index.par_bulk_query(docs)
 
-        if callable(self.analyzer):
-            analyzed_docs = [self.analyzer(doc) for doc in docs]
-            if return_similarity:
-                return self.index.par_bulk_query_tokens_return_distance(analyzed_docs)
-            else:
-                return self.index.par_bulk_query_tokens(analyzed_docs)
+
+class _AnalyzedSimHashStringIndex(SimHashStringIndex):
+    # SimHashStringIndex with a callable analyzer, chosen by SimHashStringIndex.__new__, subclasses
+    # of SimHashStringIndex are combined with it by analyzed_class,
+    # so the methods do not check the analyzer on every call.
+    # Documents are tokenized in python and passed to the native index as tokens.
+    __doc__ = SimHashStringIndex.__doc__
+
+    def insert_document(self, id, doc):
+        self.index.insert_tokens(id, self.analyzer(doc))
+
+    def query(self, doc: str, return_hamming_distance=False) -> Union[List[int], List[Tuple[int, int]]]:
+        tokens = self.analyzer(doc)
+        return self._query_tok_dist(tokens) if return_hamming_distance else self._query_tok(tokens)
+
+    def par_bulk_query(self, docs: List[str], return_similarity=False):
+        if return_similarity:
+            return self.index.par_bulk_query_with_callback_return_distance(docs, self._bulk_analyzer)
         else:
-            if return_similarity:
-                return self.index.par_bulk_query_tokens_return_distance(docs)
-            else:
-                return self.index.par_bulk_query(docs)
+            return self.index.par_bulk_query_with_callback(docs, self._bulk_analyzer)
+
+
+for _name in ('insert_document', 'query', 'par_bulk_query'):
+    getattr(_AnalyzedSimHashStringIndex, _name).__doc__ = getattr(SimHashStringIndex, _name).__doc__
@@ -1,4 +1,13 @@
+use fnv::FnvHashMap;
+use numpy::{Element, PyArray1};
+use pyo3::exceptions::{PyTypeError, PyValueError};
 use pyo3::prelude::*;
+use pyo3::types::PyString;
+use rayon::prelude::*;
+use rayon::{ThreadPool, ThreadPoolBuilder};
+use std::collections::VecDeque;
+use std::sync::mpsc::sync_channel;
+use std::sync::Arc;
 
 mod min_hash;
 mod sim_hash;
@@ -58,3 +67,166 @@ impl TokenizerSpecification {
         }
     }
 }
+
+
+/// Creates a dedicated thread pool of `n_threads` threads for an index. Without `n_threads` the index
+/// uses the global rayon pool, which is sized by `RAYON_NUM_THREADS` or the number of cpus.
+pub fn build_thread_pool(n_threads: Option<usize>) -> PyResult<Option<ThreadPool>> {
+    match n_threads {
+        None => Ok(None),
+        Some(0) => Err(PyValueError::new_err("n_threads must be greater than 0")),
+        Some(n_threads) => ThreadPoolBuilder::new()
+            .num_threads(n_threads)
+            .build()
+            .map(Some)
+            .map_err(|e| PyValueError::new_err(e.to_string())),
+    }
+}
+
+/// Runs `f` in `pool`, so rayon parallel iterators inside `f` use the threads of the pool,
+/// or on the global rayon pool if there is no pool.
+pub fn install<R: Send, F: FnOnce() -> R + Send>(pool: &Option<ThreadPool>, f: F) -> R {
+    match pool {
+        Some(pool) => pool.install(f),
+        None => f(),
+    }
+}
+
+/// Tokens converted by `par_map_analyzed`, keyed by the address of the python string.
+/// The python string is kept alive with the token, so its address can not be reused
+/// by another string while the token is cached.
+type TokenCache = FnvHashMap<usize, (PyObject, Arc<str>)>;
+
+/// The maximum number of tokens in a `TokenCache`. A full cache is cleared, so a batch with
+/// a large vocabulary does not keep all its distinct python strings alive.
+const MAX_CACHED_TOKENS: usize = 1 << 16;
+
+/// Extracts the tokens returned by the analyzer. Every distinct python string is converted
+/// once while it is cached, repeated tokens, such as interned stopwords, share the converted string.
+fn extract_tokens(py: Python, tokens: &PyAny, cache: &mut TokenCache) -> PyResult<Vec<Arc<str>>> {
+    if tokens.downcast::<PyString>().is_ok() {
+        return Err(PyTypeError::new_err("analyzer must return a sequence of strings, not str"));
+    }
+    tokens.iter()?
+        .map(|token| {
+            let token = token?;
+            let key = token.as_ptr() as usize;
+            if let Some((_, value)) = cache.get(&key) {
+                return Ok(value.clone());
+            }
+            let value: Arc<str> = Arc::from(token.extract::<&str>()?);
+            if cache.len() >= MAX_CACHED_TOKENS {
+                cache.clear();
+            }
+            cache.insert(key, (token.into_py(py), value.clone()));
+            Ok(value)
+        })
+        .collect()
+}
+
+/// Batches with fewer documents are tokenized on the calling thread, starting threads
+/// for the pipeline of `par_map_analyzed` costs more than it saves.
+const MIN_PIPELINED_DOCS: usize = 100;
+
+/// Tokenizes `docs` with the python callable `analyzer` on a `ThreadPoolExecutor` and applies `f`
+/// to the tokens of every document on rayon threads, while the remaining documents are still
+/// being tokenized. At most `2 * num_threads` documents are submitted to the executor ahead of
+/// the consumer, and tokenized documents are passed between the two stages through a bounded
+/// channel, so only a window of the batch is held in memory as tokens at a time.
+/// Up to `MAX_CACHED_TOKENS` distinct python strings are also kept alive by the token cache.
+/// Small batches are tokenized on the calling thread before `f` is applied in parallel.
+/// The results are returned in the order of `docs`. Native work runs in `pool` if given.
+pub fn par_map_analyzed<T, F>(py: Python, pool: &Option<ThreadPool>, docs: &PyAny, analyzer: &PyAny, f: F) -> PyResult<Vec<T>>
+where
+    T: Send,
+    F: Fn(Vec<Arc<str>>) -> T + Sync,
+{
+    let mut token_cache = TokenCache::default();
+    if docs.len().map_or(false, |len| len < MIN_PIPELINED_DOCS) {
+        let docs_tokens = docs.iter()?
+            .map(|doc| extract_tokens(py, analyzer.call1((doc?,))?, &mut token_cache))
+            .collect::<PyResult<Vec<_>>>()?;
+        return Ok(py.allow_threads(|| install(pool, || {
+            docs_tokens.into_par_iter().map(|tokens| f(tokens)).collect()
+        })));
+    }
+
+    let num_threads = match pool {
+        Some(pool) => pool.current_num_threads(),
+        None => rayon::current_num_threads(),
+    };
+    let window = 2 * num_threads;
+    let executor = py
+        .import("concurrent.futures")?
+        .getattr("ThreadPoolExecutor")?
+        .call1((num_threads,))?;
+    let (sender, receiver) = sync_channel::<(usize, Vec<Arc<str>>)>(window);
+    let result = std::thread::scope(|scope| {
+        let consumer = scope.spawn(|| install(pool, || {
+            let mut results: Vec<(usize, T)> = receiver
+                .into_iter()
+                .par_bridge()
+                .map(|(i, tokens)| (i, f(tokens)))
+                .collect();
+            results.sort_unstable_by_key(|result| result.0);
+            results.into_iter().map(|result| result.1).collect::<Vec<T>>()
+        }));
+        let produced = (|| -> PyResult<()> {
+            let mut docs = docs.iter()?.enumerate();
+            let mut pending = VecDeque::with_capacity(window);
+            loop {
+                while pending.len() < window {
+                    match docs.next() {
+                        Some((i, doc)) => pending.push_back((i, executor.call_method1("submit", (analyzer, doc?))?)),
+                        None => break,
+                    }
+                }
+                let (i, future) = match pending.pop_front() {
+                    Some(next) => next,
+                    None => break,
+                };
+                let tokens = extract_tokens(py, future.call_method0("result")?, &mut token_cache)?;
+                if py.allow_threads(|| sender.send((i, tokens))).is_err() {
+                    break;
+                }
+            }
+            Ok(())
+        })();
+        // closes the channel, so the consumer can finish
+        drop(sender);
+        let results = py.allow_threads(|| consumer.join())
+            .expect("analyzed documents consumer panicked");
+        produced.map(|_| results)
+    });
+    executor.call_method0("shutdown")?;
+    result
+}
+
+
+/// Validates the offsets of a CSR batch, the tokens of document `i` are
+/// `values[offsets[i]..offsets[i + 1]]`.
+pub fn check_csr_offsets(num_values: usize, offsets: &[u64]) -> PyResult<()> {
+    if offsets.is_empty() {
+        return Err(PyValueError::new_err("offsets must contain at least one element"));
+    }
+    if offsets.windows(2).any(|w| w[0] > w[1]) {
+        return Err(PyValueError::new_err("offsets must be non-decreasing"));
+    }
+    if offsets[offsets.len() - 1] as usize > num_values {
+        return Err(PyValueError::new_err("offsets point past the end of hashes"));
+    }
+    Ok(())
+}
+
+/// Flattens `rows` into a CSR pair of numpy arrays `(values, offsets)`, the values of row `i`
+/// are `values[offsets[i]:offsets[i + 1]]`.
+pub fn to_csr<'py, T: Element>(py: Python<'py>, rows: Vec<Vec<T>>) -> (&'py PyArray1<T>, &'py PyArray1<u64>) {
+    let mut offsets = Vec::with_capacity(rows.len() + 1);
+    offsets.push(0);
+    let mut values = Vec::with_capacity(rows.iter().map(|row| row.len()).sum());
+    for row in rows {
+        values.extend(row);
+        offsets.push(values.len() as u64);
+    }
+    (PyArray1::from_vec(py, values), PyArray1::from_vec(py, offsets))
+}
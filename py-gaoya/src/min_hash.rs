@@ -1,31 +1,162 @@
 use pyo3::prelude::*;
 
 
-use crate::TokenizerSpecification;
+use crate::{build_thread_pool, check_csr_offsets, install, par_map_analyzed, to_csr, TokenizerSpecification};
 use fnv::FnvBuildHasher;
+use numpy::{PyArray1, PyReadonlyArray1};
 use gaoya::minhash::{
     calculate_minhash_params,
     MinHasher, MinHasher8, MinHasher16, MinHasher32, MinHasher64V1,
+    OnePermutationHasher8, OnePermutationHasher16, OnePermutationHasher32, OnePermutationHasher64,
     HashSetContainer, SmallVecContainer, VecContainer
 };
-use gaoya::text::{shingle_text, shingle_text_range, whitespace_split, MultiShingles};
+use gaoya::text::{
+    rolling_shingle_text, rolling_shingle_text_range, shingle_text, shingle_text_range,
+    whitespace_split, MultiShingles
+};
 use shingles::Shingles;
 use pyo3::exceptions::PyValueError;
 use rayon::prelude::*;
+use rayon::ThreadPool;
+use std::hash::Hash;
 
 extern crate gaoya;
 
+/// Sketcher creates signatures for the index either with classic minhash,
+/// which applies `num_hashes` permutations to every token, or with one permutation hashing,
+/// which hashes every token once.
+pub enum Sketcher<M, O> {
+    MinHash(M),
+    OnePermutation(O),
+}
+
+impl<M, O> MinHasher for Sketcher<M, O>
+where
+    M: MinHasher,
+    O: MinHasher<V = M::V>,
+{
+    type V = M::V;
+
+    fn create_signature<T, U>(&self, iter: T) -> Vec<Self::V>
+    where
+        T: Iterator<Item = U>,
+        U: Hash,
+    {
+        match self {
+            Sketcher::MinHash(min_hash) => min_hash.create_signature(iter),
+            Sketcher::OnePermutation(oph) => oph.create_signature(iter),
+        }
+    }
+
+    fn create_signature_from_hashes<T>(&self, hashes: T) -> Vec<Self::V>
+    where
+        T: Iterator<Item = u32>,
+    {
+        match self {
+            Sketcher::MinHash(min_hash) => min_hash.create_signature_from_hashes(hashes),
+            Sketcher::OnePermutation(oph) => oph.create_signature_from_hashes(hashes),
+        }
+    }
+
+    fn create_signature_batch<I, T, U>(&self, batch: I) -> Vec<Vec<Self::V>>
+    where
+        I: Iterator<Item = T>,
+        T: Iterator<Item = U>,
+        U: Hash,
+    {
+        match self {
+            Sketcher::MinHash(min_hash) => min_hash.create_signature_batch(batch),
+            Sketcher::OnePermutation(oph) => oph.create_signature_batch(batch),
+        }
+    }
+
+    fn create_signature_batch_from_hashes<I, T>(&self, batch: I) -> Vec<Vec<Self::V>>
+    where
+        I: Iterator<Item = T>,
+        T: Iterator<Item = u32>,
+    {
+        match self {
+            Sketcher::MinHash(min_hash) => min_hash.create_signature_batch_from_hashes(batch),
+            Sketcher::OnePermutation(oph) => oph.create_signature_batch_from_hashes(batch),
+        }
+    }
+}
+
 macro_rules! py_minhash_index {
-    ($name: ident, $type: ident, $stype: expr, $container_type: ident,  $minhash: ident, $hasher: ident) => {
+    ($name: ident, $type: ident, $stype: expr, $container_type: ident,  $minhash: ident, $oph: ident, $hasher: ident) => {
         #[doc = concat!("MinHash", $stype, "StringIntIndex is a MinhashIndex that uses ", $stype, " hashes, ")]
         #[doc = "for string values and integer keys."]
-        #[pyclass(unsendable)]
+        #[pyclass]
         pub struct $name {
             pub inner: gaoya::minhash::MinHashIndex<$type, i64, $container_type>,
-            pub min_hash: $minhash<$hasher>,
+            pub min_hash: Sketcher<$minhash<$hasher>, $oph<$hasher>>,
             pub tokenizer: TokenizerSpecification,
             pub lowercase: bool,
+            pub rolling_hash: bool,
+            pool: Option<ThreadPool>,
+        }
+
+        impl $name {
+            /// Same as `tokenize_and_minhash` for a batch of documents, the signatures of
+            /// the whole batch are computed together.
+            fn tokenize_and_minhash_batch(&self, docs: &[&str]) -> Vec<Vec<$type>> {
+                let lowercase_docs: Vec<String>;
+                let docs: Vec<&str> = if self.lowercase {
+                    lowercase_docs = docs.iter().map(|doc| doc.to_lowercase()).collect();
+                    lowercase_docs.iter().map(|doc| doc.as_str()).collect()
+                } else {
+                    docs.to_vec()
+                };
+                match &self.tokenizer {
+                    TokenizerSpecification::CharShingle((from, None)) if self.rolling_hash => self
+                        .min_hash
+                        .create_signature_batch_from_hashes(docs.iter().map(|doc| rolling_shingle_text(doc, *from))),
+                    TokenizerSpecification::CharShingle((from, Some(to))) if self.rolling_hash => self
+                        .min_hash
+                        .create_signature_batch_from_hashes(docs.iter().map(|doc| rolling_shingle_text_range(doc, *from, *to))),
+                    TokenizerSpecification::CharShingle((from, None)) => self
+                        .min_hash
+                        .create_signature_batch(docs.iter().map(|doc| shingle_text(doc, *from))),
+                    TokenizerSpecification::CharShingle((from, Some(to))) => self
+                        .min_hash
+                        .create_signature_batch(docs.iter().map(|doc| shingle_text_range(doc, *from, *to))),
+                    TokenizerSpecification::WhiteSpace() => self
+                        .min_hash
+                        .create_signature_batch(docs.iter().map(|doc| whitespace_split(doc))),
+                    TokenizerSpecification::WhiteSpaceShingle((from, None)) => {
+                        let words: Vec<Vec<_>> = docs.iter().map(|doc| whitespace_split(doc).collect()).collect();
+                        self.min_hash
+                            .create_signature_batch(words.iter().map(|words| Shingles::new(words.as_slice(), *from)))
+                    }
+                    TokenizerSpecification::WhiteSpaceShingle((from, Some(to))) => {
+                        let words: Vec<Vec<_>> = docs.iter().map(|doc| whitespace_split(doc).collect()).collect();
+                        self.min_hash
+                            .create_signature_batch(words.iter().map(|words| MultiShingles::new(words.as_slice(), *from, *to)))
+                    }
+                }
+            }
+
+            fn doc_signature(&self, doc: &str) -> Vec<$type> {
+                if self.lowercase {
+                    let doc = doc.to_lowercase();
+                    self.tokenize_and_minhash(doc.as_str())
+                } else {
+                    self.tokenize_and_minhash(doc)
+                }
+            }
+
+            /// Runs `f` in the thread pool of the index.
+            fn install<R: Send, F: FnOnce() -> R + Send>(&self, f: F) -> R {
+                install(&self.pool, f)
+            }
+
+            fn bulk_hash_docs_batched(&self, docs: Vec<&str>, batch_size: usize) -> Vec<Vec<$type>> {
+                docs.par_chunks(batch_size.max(1))
+                    .flat_map_iter(|batch| self.tokenize_and_minhash_batch(batch))
+                    .collect()
+            }
         }
+
         #[pymethods]
         impl $name {
             #[new]
@@ -36,7 +167,10 @@ macro_rules! py_minhash_index {
                 num_hashes = 126,
                 analyzer = "word",
                 lowercase = false,
-                ngram_range = (1,1)
+                ngram_range = (1,1),
+                rolling_hash = false,
+                sketcher = "minhash",
+                n_threads = None
             ))]
             pub fn new(
                 jaccard_threshold: f64,
@@ -46,31 +180,38 @@ macro_rules! py_minhash_index {
                 analyzer: Option<&str>,
                 lowercase: Option<bool>,
                 ngram_range: Option<(usize, usize)>,
+                rolling_hash: Option<bool>,
+                sketcher: Option<&str>,
+                n_threads: Option<usize>,
             ) -> PyResult<Self> {
-                if let (Some(num_bands), Some(band_width)) = (num_bands, band_width) {
-                    let index = $name {
-                        inner: gaoya::minhash::MinHashIndex::<_, _, $container_type>::new_index(num_bands, band_width, jaccard_threshold),
-                        min_hash: $minhash::new(num_bands * band_width),
-                        tokenizer: TokenizerSpecification::new(analyzer.unwrap_or("word"), ngram_range),
-                        lowercase: lowercase.unwrap_or(false),
-                    };
-                    return Ok(index);
-                }
-                if let Some(num_hashes) = num_hashes {
-                    let (num_bands, band_width) = calculate_minhash_params(jaccard_threshold, num_hashes);
-                    let index = $name {
-                        inner: gaoya::minhash::MinHashIndex::<_,_, $container_type>::new_index(num_bands, band_width, jaccard_threshold),
-                        min_hash: $minhash::new(num_bands * band_width),
-                        tokenizer: TokenizerSpecification::new(analyzer.unwrap_or("word"), ngram_range),
-                        lowercase: lowercase.unwrap_or(false),
-                    };
-                    return Ok(index);
-                }
-                return Err(PyValueError::new_err("Either (num_bands, band_width) or num_hashes must be specified") );
+                let (num_bands, band_width) = match (num_bands, band_width, num_hashes) {
+                    (Some(num_bands), Some(band_width), _) => (num_bands, band_width),
+                    (_, _, Some(num_hashes)) => calculate_minhash_params(jaccard_threshold, num_hashes),
+                    _ => return Err(PyValueError::new_err("Either (num_bands, band_width) or num_hashes must be specified")),
+                };
+                let min_hash = match sketcher.unwrap_or("minhash") {
+                    "minhash" => Sketcher::MinHash($minhash::new(num_bands * band_width)),
+                    "oph" => Sketcher::OnePermutation($oph::new(num_bands * band_width)),
+                    _ => return Err(PyValueError::new_err("sketcher must be one of ('minhash', 'oph')")),
+                };
+                Ok($name {
+                    inner: gaoya::minhash::MinHashIndex::<_, _, $container_type>::new_index(num_bands, band_width, jaccard_threshold),
+                    min_hash,
+                    tokenizer: TokenizerSpecification::new(analyzer.unwrap_or("word"), ngram_range),
+                    lowercase: lowercase.unwrap_or(false),
+                    rolling_hash: rolling_hash.unwrap_or(false),
+                    pool: build_thread_pool(n_threads)?,
+                })
             }
 
             pub fn tokenize_and_minhash(&self, doc: &str) -> Vec<$type> {
                 match &self.tokenizer {
+                    TokenizerSpecification::CharShingle((from, None)) if self.rolling_hash => {
+                        self.min_hash.create_signature_from_hashes(rolling_shingle_text(doc, *from))
+                    }
+                    TokenizerSpecification::CharShingle((from, Some(to))) if self.rolling_hash => self
+                        .min_hash
+                        .create_signature_from_hashes(rolling_shingle_text_range(doc, *from, *to)),
                     TokenizerSpecification::CharShingle((from, None)) => {
                         self.min_hash.create_signature(shingle_text(doc, *from))
                     }
@@ -93,20 +234,18 @@ macro_rules! py_minhash_index {
                 }
             }
 
-            pub fn insert_document(&mut self, id: i64, doc: &str) {
-                if self.lowercase {
-                    let doc = doc.to_lowercase();
-                    self.inner
-                        .insert(id, self.tokenize_and_minhash(doc.as_str()))
-                } else {
-                    self.inner
-                        .insert(id, self.tokenize_and_minhash(doc))
-                }
+            pub fn insert_document(&mut self, py: Python, id: i64, doc: &str) {
+                py.allow_threads(|| {
+                    let signature = self.doc_signature(doc);
+                    self.inner.insert(id, signature)
+                })
             }
 
-            pub fn insert_tokens(&mut self, id: i64, tokens: Vec<&str>) {
-                self.inner
-                    .insert(id, self.min_hash.create_signature(tokens.iter()));
+            pub fn insert_tokens(&mut self, py: Python, id: i64, tokens: Vec<&str>) {
+                py.allow_threads(|| {
+                    let signature = self.min_hash.create_signature(tokens.iter());
+                    self.inner.insert(id, signature)
+                })
             }
 
             pub fn remove(&mut self, id: i64) {
@@ -129,11 +268,12 @@ macro_rules! py_minhash_index {
             pub fn par_bulk_insert_docs(&mut self, ids: Vec<i64>, docs: Vec<&str>) {
                 if ids.len() < 100 { // TODO: find a reasonable threshold
                     for (id, doc) in ids.iter().zip(docs.iter()) {
-                        self.insert_document(*id, doc)
+                        let signature = self.doc_signature(doc);
+                        self.inner.insert(*id, signature)
                     }
                 } else {
-                    let signatures = self.bulk_hash_docs(docs);
-                    self.inner.par_bulk_insert(ids, signatures);
+                    let signatures = self.install(|| self.bulk_hash_docs(docs));
+                    install(&self.pool, || self.inner.par_bulk_insert(ids, signatures));
                 }
             }
 
@@ -147,68 +287,160 @@ macro_rules! py_minhash_index {
             }
 
             pub fn par_bulk_insert_tokens(&mut self, ids: Vec<i64>, tokens: Vec<Vec<&str>>) {
-                let hashes = self.min_hash.bulk_create_signature(&tokens);
-                self.inner.par_bulk_insert(ids, hashes);
+                let hashes = self.install(|| self.min_hash.bulk_create_signature(&tokens));
+                install(&self.pool, || self.inner.par_bulk_insert(ids, hashes));
             }
 
-            pub fn query_tokens(&self, tokens: Vec<&str>) -> Vec<i64> {
-                let signature = &self.min_hash.create_signature(tokens.iter());
-                self.inner.query_owned(signature).into_iter().collect()
+            pub fn par_bulk_insert_docs_with_callback(&mut self, py: Python, ids: Vec<i64>, docs: &PyAny, analyzer: &PyAny) -> PyResult<()> {
+                let min_hash = &self.min_hash;
+                let signatures = par_map_analyzed(py, &self.pool, docs, analyzer, |tokens| {
+                    min_hash.create_signature(tokens.iter())
+                })?;
+                install(&self.pool, || self.inner.par_bulk_insert(ids, signatures));
+                Ok(())
             }
 
-            pub fn query_tokens_return_similarity(&self, tokens: Vec<&str>) ->  Vec<(i64, f64)> {
-                let signature = &self.min_hash.create_signature(tokens.iter());
-                self.inner.query_owned_return_similarity(&signature)
+            /// Inserts documents given as precomputed 32 bit token hashes in CSR layout,
+            /// the tokens of document `i` are `hashes[offsets[i]..offsets[i + 1]]`.
+            pub fn par_bulk_insert_token_hashes(&mut self, py: Python, ids: Vec<i64>,
+                                                hashes: PyReadonlyArray1<'_, u32>,
+                                                offsets: PyReadonlyArray1<'_, u64>) -> PyResult<()> {
+                let (hashes, offsets) = (hashes.as_slice()?, offsets.as_slice()?);
+                check_csr_offsets(hashes.len(), offsets)?;
+                if ids.len() + 1 != offsets.len() {
+                    return Err(PyValueError::new_err("offsets must contain one more element than ids"));
+                }
+                let (min_hash, inner, pool) = (&self.min_hash, &mut self.inner, &self.pool);
+                py.allow_threads(|| install(pool, || {
+                    let signatures = offsets
+                        .par_windows(2)
+                        .map(|w| min_hash.create_signature_from_hashes(hashes[w[0] as usize..w[1] as usize].iter().copied()))
+                        .collect();
+                    inner.par_bulk_insert(ids, signatures);
+                }));
+                Ok(())
             }
 
-            pub fn query(&self, doc: &str) -> Vec<i64> {
-                let signature = if self.lowercase {
-                    let doc = doc.to_lowercase();
-                    self.tokenize_and_minhash(doc.as_str())
-                } else {
-                    self.tokenize_and_minhash(doc)
-                };
-                self.inner
-                    .query_owned(&signature)
-                    .into_iter()
-                    .collect()
+            /// Searches the index for documents given as precomputed 32 bit token hashes
+            /// in CSR layout. Returns CSR pair `(ids, offsets)` of numpy arrays.
+            pub fn par_bulk_query_token_hashes<'py>(&self, py: Python<'py>,
+                                                    hashes: PyReadonlyArray1<'py, u32>,
+                                                    offsets: PyReadonlyArray1<'py, u64>) -> PyResult<(&'py PyArray1<i64>, &'py PyArray1<u64>)> {
+                let (hashes, offsets) = (hashes.as_slice()?, offsets.as_slice()?);
+                check_csr_offsets(hashes.len(), offsets)?;
+                let (min_hash, inner, pool) = (&self.min_hash, &self.inner, &self.pool);
+                let result: Vec<Vec<i64>> = py.allow_threads(|| install(pool, || {
+                    offsets
+                        .par_windows(2)
+                        .map(|w| {
+                            let signature = min_hash.create_signature_from_hashes(hashes[w[0] as usize..w[1] as usize].iter().copied());
+                            inner.query_owned(&signature).into_iter().collect()
+                        })
+                        .collect()
+                }));
+                Ok(to_csr(py, result))
             }
 
-            pub fn query_return_similarity(&self, doc: &str) -> Vec<(i64, f64)> {
-                let signature = if self.lowercase {
-                    let doc = doc.to_lowercase();
-                    self.tokenize_and_minhash(doc.as_str())
-                } else {
-                    self.tokenize_and_minhash(doc)
-                };
-                self.inner.query_owned_return_similarity(&signature)
+            pub fn query_tokens(&self, py: Python, tokens: Vec<&str>) -> Vec<i64> {
+                py.allow_threads(|| {
+                    let signature = &self.min_hash.create_signature(tokens.iter());
+                    self.inner.query_owned(signature).into_iter().collect()
+                })
+            }
+
+            pub fn query_tokens_return_similarity(&self, py: Python, tokens: Vec<&str>) ->  Vec<(i64, f64)> {
+                py.allow_threads(|| {
+                    let signature = &self.min_hash.create_signature(tokens.iter());
+                    self.inner.query_owned_return_similarity(&signature)
+                })
+            }
+
+            pub fn query(&self, py: Python, doc: &str) -> Vec<i64> {
+                py.allow_threads(|| {
+                    let signature = self.doc_signature(doc);
+                    self.inner
+                        .query_owned(&signature)
+                        .into_iter()
+                        .collect()
+                })
+            }
+
+            pub fn query_return_similarity(&self, py: Python, doc: &str) -> Vec<(i64, f64)> {
+                py.allow_threads(|| {
+                    let signature = self.doc_signature(doc);
+                    self.inner.query_owned_return_similarity(&signature)
+                })
             }
 
             pub fn par_bulk_query(&self, docs: Vec<&str>) -> Vec<Vec<i64>> {
-                let signatures = self.bulk_hash_docs(docs);
-                self.inner.par_bulk_query(&signatures)
-                    .into_iter()
-                    .map(|set| set.into_iter().collect())
-                    .collect()
+                self.install(|| {
+                    let signatures = self.bulk_hash_docs(docs);
+                    self.inner.par_bulk_query(&signatures)
+                        .into_iter()
+                        .map(|set| set.into_iter().collect())
+                        .collect()
+                })
             }
 
             pub fn par_bulk_query_return_similarity(&self, docs: Vec<&str>) -> Vec<Vec<(i64, f64)>> {
-                let signatures = self.bulk_hash_docs(docs);
-                self.inner.par_bulk_query_return_similarity(&signatures)
+                self.install(|| {
+                    let signatures = self.bulk_hash_docs(docs);
+                    self.inner.par_bulk_query_return_similarity(&signatures)
+                })
+            }
+
+            /// Same as `par_bulk_query`, but every native thread computes the signatures
+            /// of `batch_size` documents at once.
+            #[pyo3(signature = (docs, batch_size = 16))]
+            pub fn par_bulk_query_batched(&self, docs: Vec<&str>, batch_size: usize) -> Vec<Vec<i64>> {
+                self.install(|| {
+                    let signatures = self.bulk_hash_docs_batched(docs, batch_size);
+                    self.inner.par_bulk_query(&signatures)
+                        .into_iter()
+                        .map(|set| set.into_iter().collect())
+                        .collect()
+                })
             }
 
+            #[pyo3(signature = (docs, batch_size = 16))]
+            pub fn par_bulk_query_batched_return_similarity(&self, docs: Vec<&str>, batch_size: usize) -> Vec<Vec<(i64, f64)>> {
+                self.install(|| {
+                    let signatures = self.bulk_hash_docs_batched(docs, batch_size);
+                    self.inner.par_bulk_query_return_similarity(&signatures)
+                })
+            }
 
             pub fn par_bulk_query_tokens(&self, tokens: Vec<Vec<&str>>) -> Vec<Vec<i64>> {
-                let signatures = self.min_hash.bulk_create_signature(&tokens);
-                self.inner.par_bulk_query(&signatures)
-                    .into_iter()
-                    .map(|set| set.into_iter().collect())
-                    .collect()
+                self.install(|| {
+                    let signatures = self.min_hash.bulk_create_signature(&tokens);
+                    self.inner.par_bulk_query(&signatures)
+                        .into_iter()
+                        .map(|set| set.into_iter().collect())
+                        .collect()
+                })
             }
 
             pub fn par_bulk_query_tokens_return_similarity(&self, tokens: Vec<Vec<&str>>) -> Vec<Vec<(i64, f64)>> {
-                let signatures = self.min_hash.bulk_create_signature(&tokens);
-                self.inner.par_bulk_query_return_similarity(&signatures)
+                self.install(|| {
+                    let signatures = self.min_hash.bulk_create_signature(&tokens);
+                    self.inner.par_bulk_query_return_similarity(&signatures)
+                })
+            }
+
+            pub fn par_bulk_query_with_callback(&self, py: Python, docs: &PyAny, analyzer: &PyAny) -> PyResult<Vec<Vec<i64>>> {
+                let (min_hash, inner) = (&self.min_hash, &self.inner);
+                par_map_analyzed(py, &self.pool, docs, analyzer, |tokens| {
+                    let signature = min_hash.create_signature(tokens.iter());
+                    inner.query_owned(&signature).into_iter().collect()
+                })
+            }
+
+            pub fn par_bulk_query_with_callback_return_similarity(&self, py: Python, docs: &PyAny, analyzer: &PyAny) -> PyResult<Vec<Vec<(i64, f64)>>> {
+                let (min_hash, inner) = (&self.min_hash, &self.inner);
+                par_map_analyzed(py, &self.pool, docs, analyzer, |tokens| {
+                    let signature = min_hash.create_signature(tokens.iter());
+                    inner.query_owned_return_similarity(&signature)
+                })
             }
 
 
@@ -231,24 +463,27 @@ macro_rules! py_minhash_index {
 
 type HashSetContaineri64 = HashSetContainer<i64>;
 type VecContaineri64 = VecContainer<i64>;
+// Two inline ids fit into the space SmallVec needs for its heap pointer and length anyway,
+// it stays at 32 bytes and a band entry together with its key at 40 bytes. Four inline ids
+// would grow every bucket, including the single id buckets that dominate the bands.
 type SmallVecContaineri64 = SmallVecContainer<i64, 2>;
 
-py_minhash_index!(MinHash64StringIntIndexHashSet, u64, "64", HashSetContaineri64, MinHasher64V1, FnvBuildHasher);
-py_minhash_index!(MinHash64StringIntIndexVec, u64, "64", VecContaineri64, MinHasher64V1, FnvBuildHasher);
-py_minhash_index!(MinHash64StringIntIndexSmallVec, u64, "64", SmallVecContaineri64, MinHasher64V1, FnvBuildHasher);
+py_minhash_index!(MinHash64StringIntIndexHashSet, u64, "64", HashSetContaineri64, MinHasher64V1, OnePermutationHasher64, FnvBuildHasher);
+py_minhash_index!(MinHash64StringIntIndexVec, u64, "64", VecContaineri64, MinHasher64V1, OnePermutationHasher64, FnvBuildHasher);
+py_minhash_index!(MinHash64StringIntIndexSmallVec, u64, "64", SmallVecContaineri64, MinHasher64V1, OnePermutationHasher64, FnvBuildHasher);
 
-py_minhash_index!(MinHash32StringIntIndexHashSet, u32, "32", HashSetContaineri64, MinHasher32, FnvBuildHasher);
-py_minhash_index!(MinHash32StringIntIndexVec, u32, "32", VecContaineri64, MinHasher32, FnvBuildHasher);
-py_minhash_index!(MinHash32StringIntIndexSmallVec, u32, "32", SmallVecContaineri64, MinHasher32, FnvBuildHasher);
+py_minhash_index!(MinHash32StringIntIndexHashSet, u32, "32", HashSetContaineri64, MinHasher32, OnePermutationHasher32, FnvBuildHasher);
+py_minhash_index!(MinHash32StringIntIndexVec, u32, "32", VecContaineri64, MinHasher32, OnePermutationHasher32, FnvBuildHasher);
+py_minhash_index!(MinHash32StringIntIndexSmallVec, u32, "32", SmallVecContaineri64, MinHasher32, OnePermutationHasher32, FnvBuildHasher);
 
 
-py_minhash_index!(MinHash16StringIntIndexHashSet, u16, "16", HashSetContaineri64, MinHasher16, FnvBuildHasher);
-py_minhash_index!(MinHash16StringIntIndexVec, u16, "16", VecContaineri64, MinHasher16, FnvBuildHasher);
-py_minhash_index!(MinHash16StringIntIndexSmallVec, u16, "16", SmallVecContaineri64, MinHasher16, FnvBuildHasher);
+py_minhash_index!(MinHash16StringIntIndexHashSet, u16, "16", HashSetContaineri64, MinHasher16, OnePermutationHasher16, FnvBuildHasher);
+py_minhash_index!(MinHash16StringIntIndexVec, u16, "16", VecContaineri64, MinHasher16, OnePermutationHasher16, FnvBuildHasher);
+py_minhash_index!(MinHash16StringIntIndexSmallVec, u16, "16", SmallVecContaineri64, MinHasher16, OnePermutationHasher16, FnvBuildHasher);
 
-py_minhash_index!(MinHash8StringIntIndexHashSet, u8, "8", HashSetContaineri64, MinHasher8, FnvBuildHasher);
-py_minhash_index!(MinHash8StringIntIndexVec, u8, "8", VecContaineri64, MinHasher8, FnvBuildHasher);
-py_minhash_index!(MinHash8StringIntIndexSmallVec, u8, "8", SmallVecContaineri64, MinHasher8, FnvBuildHasher);
+py_minhash_index!(MinHash8StringIntIndexHashSet, u8, "8", HashSetContaineri64, MinHasher8, OnePermutationHasher8, FnvBuildHasher);
+py_minhash_index!(MinHash8StringIntIndexVec, u8, "8", VecContaineri64, MinHasher8, OnePermutationHasher8, FnvBuildHasher);
+py_minhash_index!(MinHash8StringIntIndexSmallVec, u8, "8", SmallVecContaineri64, MinHasher8, OnePermutationHasher8, FnvBuildHasher);
 
 
 
@@ -5,17 +5,19 @@ use gaoya::simhash::{SimHash, SimHashIndex, SimSipHasher64};
 use gaoya::text::{shingle_text,  shingle_text_range, whitespace_split, MultiShingles};
 use shingles::Shingles;
 use rayon::prelude::*;
-use crate::TokenizerSpecification;
+use crate::{build_thread_pool, install, par_map_analyzed, TokenizerSpecification};
+use rayon::ThreadPool;
 
 
 macro_rules! py_simhash_index {
     ($name: ident, $type: ident, $bitlen: expr, $stype: expr, $simhasher: ident) => {
-        #[pyclass(unsendable)]
+        #[pyclass]
         pub struct $name {
             inner: gaoya::simhash::SimHashIndex<$type, i64>,
             sim_hash: SimHash<$simhasher, $type, $bitlen>,
             tokenizer: TokenizerSpecification,
             pub lowercase: bool,
+            pool: Option<ThreadPool>,
         }
         #[pymethods]
             impl $name {
@@ -25,18 +27,21 @@ macro_rules! py_simhash_index {
                 max_distance = 5,
                 analyzer = "word",
                 lowercase = false,
-                ngram_range = (1,1)
+                ngram_range = (1,1),
+                n_threads = None
             ))]
             pub fn new(num_blocks: usize,
                        max_distance: usize,
                        analyzer: Option<&str>,
                        lowercase: Option<bool>,
-                       ngram_range: Option<(usize, usize)>) -> PyResult<Self> {
+                       ngram_range: Option<(usize, usize)>,
+                       n_threads: Option<usize>) -> PyResult<Self> {
                 let index = $name {
                     inner: SimHashIndex::new(num_blocks, max_distance),
                     sim_hash: SimHash::<$simhasher, $type, $bitlen>::new($simhasher::new(5, 6)),
                     tokenizer: TokenizerSpecification::new(analyzer.unwrap_or("word"), ngram_range),
                     lowercase: lowercase.unwrap_or(false),
+                    pool: build_thread_pool(n_threads)?,
                 };
                 Ok(index)
             }
@@ -82,85 +87,120 @@ macro_rules! py_simhash_index {
 
 
 
-            pub fn insert_document(&mut self, id: i64, doc: &str) {
-                let signature = self.doc2signature(doc);
-                self.inner.insert(id, signature);
+            pub fn insert_document(&mut self, py: Python, id: i64, doc: &str) {
+                py.allow_threads(|| {
+                    let signature = self.doc2signature(doc);
+                    self.inner.insert(id, signature);
+                })
             }
 
-            pub fn insert_tokens(&mut self, id: i64, tokens: Vec<&str>) {
-                self.inner
-                    .insert(id, self.sim_hash.create_signature(tokens.iter()));
+            pub fn insert_tokens(&mut self, py: Python, id: i64, tokens: Vec<&str>) {
+                py.allow_threads(|| {
+                    let signature = self.sim_hash.create_signature(tokens.iter());
+                    self.inner.insert(id, signature);
+                })
             }
 
             pub fn par_bulk_insert_tokens(&mut self, ids: Vec<i64>, docs_tokens: Vec<Vec<&str>>) {
-                let signatures = docs_tokens
+                let signatures = install(&self.pool, || docs_tokens
                     .par_iter()
                     .map(|tokens| self.sim_hash.create_signature(tokens.iter()))
-                    .collect();
-                self.inner.par_bulk_insert(ids, signatures);
+                    .collect());
+                install(&self.pool, || self.inner.par_bulk_insert(ids, signatures));
             }
 
 
             pub fn par_bulk_insert_docs(&mut self, ids: Vec<i64>, docs: Vec<&str>) {
                 if ids.len() < 100 {
                     for (id, doc) in ids.iter().zip(docs.iter()) {
-                        self.insert_document(*id, doc)
+                        let signature = self.doc2signature(doc);
+                        self.inner.insert(*id, signature);
                     }
                 } else {
-                    let signatures = docs
+                    let signatures = install(&self.pool, || docs
                         .par_iter()
                         .map(|doc| self.doc2signature(doc))
-                        .collect();
-                    self.inner.par_bulk_insert(ids, signatures);
+                        .collect());
+                    install(&self.pool, || self.inner.par_bulk_insert(ids, signatures));
                 }
             }
 
-            pub fn query(&self, doc: &str) -> Vec<i64> {
-                let signature = self.doc2signature(doc);
-                self.inner
-                    .query(&signature)
-                    .into_iter()
-                    .map(|id_ref| id_ref.clone())
-                    .collect()
+            pub fn query(&self, py: Python, doc: &str) -> Vec<i64> {
+                py.allow_threads(|| {
+                    let signature = self.doc2signature(doc);
+                    self.inner
+                        .query(&signature)
+                        .into_iter()
+                        .map(|id_ref| id_ref.clone())
+                        .collect()
+                })
             }
 
-            pub fn query_return_distance(&self, doc: &str) -> Vec<(i64, usize)> {
-                let signature = self.doc2signature(doc);
-                self.inner.query_return_distance(&signature)
+            pub fn query_return_distance(&self, py: Python, doc: &str) -> Vec<(i64, usize)> {
+                py.allow_threads(|| {
+                    let signature = self.doc2signature(doc);
+                    self.inner.query_return_distance(&signature)
+                })
             }
 
-            pub fn query_tokens(&self, tokens: Vec<&str>) -> Vec<i64> {
-                let signature = self.sim_hash.create_signature(tokens.iter());
-                self.inner
-                    .query(&signature)
-                    .into_iter()
-                    .map(|id_ref| id_ref.clone())
-                    .collect()
+            pub fn query_tokens(&self, py: Python, tokens: Vec<&str>) -> Vec<i64> {
+                py.allow_threads(|| {
+                    let signature = self.sim_hash.create_signature(tokens.iter());
+                    self.inner
+                        .query(&signature)
+                        .into_iter()
+                        .map(|id_ref| id_ref.clone())
+                        .collect()
+                })
             }
 
-            pub fn query_tokens_return_distance(&self, tokens: Vec<&str>) -> Vec<(i64, usize)> {
-                let signature = self.sim_hash.create_signature(tokens.iter());
-                self.inner.query_return_distance(&signature)
+            pub fn query_tokens_return_distance(&self, py: Python, tokens: Vec<&str>) -> Vec<(i64, usize)> {
+                py.allow_threads(|| {
+                    let signature = self.sim_hash.create_signature(tokens.iter());
+                    self.inner.query_return_distance(&signature)
+                })
             }
 
             pub fn par_bulk_query(&self, docs: Vec<&str>) -> Vec<Vec<i64>> {
-                let signatures = self.par_bulk_doc2signatures(docs);
-                self.inner.par_bulk_query(&signatures)
-                    .into_iter()
-                    .map(|set| set.into_iter().collect())
-                    .collect()
+                install(&self.pool, || {
+                    let signatures = self.par_bulk_doc2signatures(docs);
+                    self.inner.par_bulk_query(&signatures)
+                        .into_iter()
+                        .map(|set| set.into_iter().collect())
+                        .collect()
+                })
             }
 
             pub fn par_bulk_query_return_distance(&self, docs: Vec<&str>) -> Vec<Vec<(i64, usize)>> {
-                let signatures = self.par_bulk_doc2signatures(docs);
-                self.inner.par_bulk_query_return_distance(&signatures)
+                install(&self.pool, || {
+                    let signatures = self.par_bulk_doc2signatures(docs);
+                    self.inner.par_bulk_query_return_distance(&signatures)
+                })
             }
 
             pub fn par_bulk_query_tokens_return_similarity(&self, doc_tokens: Vec<Vec<&str>>) -> Vec<Vec<(i64, usize)>> {
-                let signatures = doc_tokens.par_iter()
-                    .map(|tokens| self.sim_hash.create_signature(tokens.iter()))
-                    .collect();
-                self.inner.par_bulk_query_return_distance(&signatures)
+                install(&self.pool, || {
+                    let signatures = doc_tokens.par_iter()
+                        .map(|tokens| self.sim_hash.create_signature(tokens.iter()))
+                        .collect();
+                    self.inner.par_bulk_query_return_distance(&signatures)
+                })
+            }
+
+            pub fn par_bulk_query_with_callback(&self, py: Python, docs: &PyAny, analyzer: &PyAny) -> PyResult<Vec<Vec<i64>>> {
+                let (sim_hash, inner) = (&self.sim_hash, &self.inner);
+                par_map_analyzed(py, &self.pool, docs, analyzer, |tokens| {
+                    let signature = sim_hash.create_signature(tokens.iter());
+                    inner.query_owned(&signature).into_iter().collect()
+                })
+            }
+
+            pub fn par_bulk_query_with_callback_return_distance(&self, py: Python, docs: &PyAny, analyzer: &PyAny) -> PyResult<Vec<Vec<(i64, usize)>>> {
+                let (sim_hash, inner) = (&self.sim_hash, &self.inner);
+                par_map_analyzed(py, &self.pool, docs, analyzer, |tokens| {
+                    let signature = sim_hash.create_signature(tokens.iter());
+                    inner.query_return_distance(&signature)
+                })
             }
 
         }
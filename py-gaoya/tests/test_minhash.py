@@ -1,6 +1,10 @@
+import gc
+import weakref
 from typing import Set
 
-from gaoya.minhash import MinHashStringIndex
+import pytest
+
+from gaoya.minhash import MinHashStringIndex, _optimal_bands
 
 
 def test_minhash_64bit():
@@ -72,6 +76,163 @@ def test_minhash_16bit_custom_analyzer():
     assert index.query("FOO bar BAZ") == [2]
 
 
+def test_minhash_custom_analyzer_no_reference_cycle():
+    index = MinHashStringIndex(32, 0.5, 30, 5, analyzer=str.split)
+    assert isinstance(index, MinHashStringIndex)
+    assert index.query.__doc__ == MinHashStringIndex.query.__doc__
+    ref = weakref.ref(index)
+    gc.disable()
+    try:
+        del index
+        assert ref() is None
+    finally:
+        gc.enable()
+
+
+def test_minhash_custom_analyzer_subclass():
+    class UppercaseIndex(MinHashStringIndex):
+        def query(self, doc, return_similarity=False):
+            return super().query(doc.upper(), return_similarity)
+
+    def first_token(doc):
+        return doc.split(" ")[:1]
+
+    index = UppercaseIndex(32, 0.5, 30, 5, analyzer=first_token)
+    assert isinstance(index, UppercaseIndex)
+    assert type(index) is type(UppercaseIndex(32, 0.5, 30, 5, analyzer=first_token))
+    index.insert_document(1, "FOO 1 2 3 4 5 6")
+    index.par_bulk_insert_docs([2], ["BAR 1 2 3 4 5 6"])
+    # only the first token is indexed, the native tokenizer would not match these queries
+    assert index.query("foo 7 8 9 10 11 12") == [1]
+    assert index.par_bulk_query(["BAR 7 8 9 10 11 12", "bar 1 2 3 4 5 6"]) == [[2], []]
+    assert type(UppercaseIndex(32, 0.5, 30, 5)) is UppercaseIndex
+
+
+def test_minhash_custom_analyzer_bulk():
+    def split_and_uppercase(doc):
+        return [token.upper() for token in doc.split(" ")]
+
+    index = MinHashStringIndex(
+        hash_size=32,
+        jaccard_threshold=0.5,
+        num_bands=40, band_size=5, num_hashes=None,
+        analyzer=split_and_uppercase)
+    corpus = ["a b c d e f g", "foo bar baz", "1 2 3 4 5 6 7 8"] * 100
+    index.par_bulk_insert_docs(list(range(len(corpus))), corpus)
+    assert index.size() == len(corpus)
+
+    result = index.par_bulk_query(["A B C D E F G", "FOO bar BAZ", "x y z"])
+    assert set(result[0]) == set(range(0, len(corpus), 3))
+    assert set(result[1]) == set(range(1, len(corpus), 3))
+    assert result[2] == []
+
+    result = index.par_bulk_query(["a b c d e f g"], return_similarity=True)
+    assert len(result[0]) == 100
+    assert all(similarity == 1.0 for _, similarity in result[0])
+
+
+def test_minhash_custom_analyzer_bulk_repeated_tokens():
+    def split_and_rebuild(doc):
+        # equal tokens are distinct string objects
+        return ["".join(list(token)) for token in doc.split(" ")]
+
+    index = MinHashStringIndex(32, 0.5, 30, 5, analyzer=split_and_rebuild)
+    corpus = ["the cat and the hat", "the dog and the log", "a b c d e f g"] * 50
+    index.par_bulk_insert_docs(list(range(len(corpus))), corpus)
+    assert [set(ids) for ids in index.par_bulk_query(corpus[:3])] == [set(index.query(doc)) for doc in corpus[:3]]
+
+    index = MinHashStringIndex(32, 0.5, 30, 5, analyzer=lambda doc: doc)
+    with pytest.raises(TypeError):
+        index.par_bulk_insert_docs([1], ["a b c"])
+
+
+def test_minhash_one_permutation_hashing():
+    for hash_size in (8, 16, 32, 64):
+        do_test_minhash(MinHashStringIndex(hash_size, 0.5, 30, 5, sketcher="oph"))
+
+    try:
+        MinHashStringIndex(32, 0.5, 30, 5, sketcher="superminhash")
+        assert False, "sketcher superminhash is not supported"
+    except Exception as e:
+        assert type(e) == ValueError
+
+
+def test_minhash_rolling_hash():
+    index = MinHashStringIndex(32, 0.5, 30, 5, analyzer='char', ngram_range=(3, 3), rolling_hash=True)
+    index.insert_document(1, "locality sensitive hashing is cool")
+    index.insert_document(2, "we all scream for ice cream")
+
+    assert index.query("locality sensitive hashing is cool") == [1]
+    assert index.query("locality sensitive hashing is great") == [1]
+    assert index.query("we all scream for ice cream sandwich") == [2]
+    assert index.query("something completely different") == []
+
+
+def test_minhash_bulk_query_batched():
+    for analyzer, ngram_range in (('word', (1, 1)), ('word', (1, 2)), ('char', (3, 4))):
+        index = MinHashStringIndex(32, 0.5, 30, 5, analyzer=analyzer, lowercase=True, ngram_range=ngram_range)
+        corpus = [
+            "locality sensitive hashing is cool",
+            "we all scream for ice cream",
+            "This is the first document.",
+            "And this is the third document.",
+            "",
+            "Something Completely Different",
+        ]
+        index.par_bulk_insert_docs(list(range(len(corpus))), corpus)
+        queries = [doc.upper() for doc in corpus] * 3
+        assert [set(ids) for ids in index.par_bulk_query(queries)] == [set(index.query(doc)) for doc in queries]
+        assert [set(ids) for ids in index.minhash_index.par_bulk_query_batched(queries, 1)] == \
+               [set(index.query(doc)) for doc in queries]
+
+
+def test_minhash_prehashed():
+    np = pytest.importorskip("numpy")
+    docs = [
+        [1, 2, 3, 4, 5, 6, 7, 8, 9, 10],
+        [100, 200, 300, 400, 500, 600],
+        [1, 2, 3, 4, 5, 6, 7, 8, 9, 11],
+    ]
+    hashes = np.concatenate([np.array(doc, dtype=np.uint32) for doc in docs])
+    offsets = np.cumsum([0] + [len(doc) for doc in docs], dtype=np.uint64)
+    for hash_size in (8, 16, 32, 64):
+        index = MinHashStringIndex(hash_size, 0.5, 30, 5)
+        index.par_bulk_insert_prehashed([0, 1, 2], hashes, offsets)
+        assert index.size() == 3
+
+        ids, result_offsets = index.par_bulk_query_prehashed(hashes, offsets)
+        result = [set(ids[result_offsets[i]:result_offsets[i + 1]]) for i in range(len(docs))]
+        assert result == [{0, 2}, {1}, {0, 2}]
+
+        with pytest.raises(ValueError):
+            index.par_bulk_query_prehashed(hashes, [0, len(hashes) + 1])
+
+
+def test_minhash_thread_pool():
+    index = MinHashStringIndex(32, 0.5, 30, 5, n_threads=2)
+    corpus = ["a b c d e f g", "foo bar baz", "1 2 3 4 5 6 7 8"] * 100
+    index.par_bulk_insert_docs(list(range(len(corpus))), corpus)
+    assert index.size() == len(corpus)
+    result = index.par_bulk_query(["a b c d e f g", "x y z"])
+    assert set(result[0]) == set(range(0, len(corpus), 3))
+    assert result[1] == []
+
+    with pytest.raises(ValueError):
+        MinHashStringIndex(32, 0.5, 30, 5, n_threads=0)
+
+
+def test_optimal_bands():
+    # the defaults of the native constructor
+    assert _optimal_bands(0.5, 126) == (42, 3)
+    assert _optimal_bands(0.75, 128) == (25, 5)
+    num_bands, band_size = _optimal_bands(0.9, 200)
+    assert num_bands * band_size <= 200
+
+    index = MinHashStringIndex(32, 0.5, None, None, 126)
+    index.insert_document(1, "a b c d e f g")
+    assert index.query("a b c d e f g") == [1]
+
+
 def test_documents():
     index = MinHashStringIndex(32, 0.5, 42, 3, None, 'word', True, (1,1))
     corpus = [
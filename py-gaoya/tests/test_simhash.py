@@ -0,0 +1,116 @@
+import gc
+import weakref
+
+import pytest
+
+from gaoya.simhash import SimHashStringIndex
+
+
+def do_test_simhash(index):
+    index.insert_document(1, "locality sensitive hashing is cool")
+    index.insert_document(2, "we all scream for ice cream")
+
+    assert index.query("locality sensitive hashing is cool") == [1]
+    assert index.query("we all scream for ice cream") == [2]
+    assert index.query("something completely different") == []
+
+    assert index.query("locality sensitive hashing is cool", return_hamming_distance=True) == [(1, 0)]
+    assert index.query("something completely different", return_hamming_distance=True) == []
+
+
+def test_simhash_64bit():
+    do_test_simhash(SimHashStringIndex(64, 6, 5))
+    do_test_simhash(SimHashStringIndex(64, 6, 5, analyzer='char', ngram_range=(3, 4)))
+
+
+def test_simhash_128bit():
+    do_test_simhash(SimHashStringIndex(128, 8, 6))
+    do_test_simhash(SimHashStringIndex(128, 8, 6, analyzer='char', ngram_range=(3, 4)))
+
+
+def test_simhash_invalid_parameters():
+    with pytest.raises(ValueError):
+        SimHashStringIndex(32)
+    with pytest.raises(ValueError):
+        SimHashStringIndex(64, 6, 6)
+    with pytest.raises(ValueError):
+        SimHashStringIndex(64, 6, 5, analyzer='sentence')
+
+
+def test_simhash_lowercase():
+    index = SimHashStringIndex(64, 6, 5, lowercase=True)
+    index.insert_document(1, "Locality Sensitive Hashing Is Cool")
+    assert index.query("LOCALITY SENSITIVE HASHING IS COOL", return_hamming_distance=True) == [(1, 0)]
+
+
+def test_simhash_custom_analyzer():
+    def split_and_uppercase(doc):
+        return [token.upper() for token in doc.split(" ")]
+
+    for hash_size in (64, 128):
+        index = SimHashStringIndex(hash_size, 6, 5, analyzer=split_and_uppercase)
+        do_test_simhash(index)
+        assert index.query("LOCALITY sensitive HASHING is COOL") == [1]
+        assert index.query("We All Scream For Ice Cream", return_hamming_distance=True) == [(2, 0)]
+
+
+def test_simhash_custom_analyzer_no_reference_cycle():
+    index = SimHashStringIndex(64, 6, 5, analyzer=str.split)
+    assert isinstance(index, SimHashStringIndex)
+    assert index.query.__doc__ == SimHashStringIndex.query.__doc__
+    ref = weakref.ref(index)
+    gc.disable()
+    try:
+        del index
+        assert ref() is None
+    finally:
+        gc.enable()
+
+
+def test_simhash_custom_analyzer_subclass():
+    class UppercaseIndex(SimHashStringIndex):
+        def query(self, doc, return_hamming_distance=False):
+            return super().query(doc.upper(), return_hamming_distance)
+
+    def first_token(doc):
+        return doc.split(" ")[:1]
+
+    index = UppercaseIndex(64, 6, 5, analyzer=first_token)
+    assert isinstance(index, UppercaseIndex)
+    index.insert_document(1, "LOCALITY SENSITIVE HASHING IS COOL")
+    # only the first token is hashed, the native tokenizer would not match these queries
+    assert index.query("locality is great", return_hamming_distance=True) == [(1, 0)]
+    assert index.par_bulk_query(["LOCALITY is great", "locality is great"]) == [[1], []]
+    assert type(UppercaseIndex(64, 6, 5)) is UppercaseIndex
+
+
+def _test_simhash_bulk(index):
+    corpus = ["locality sensitive hashing is cool", "we all scream for ice cream",
+              "this is the first document"]
+    for i, doc in enumerate(corpus * 50):
+        index.insert_document(i, doc)
+
+    # 150 queries take the pipelined path of a callable analyzer, the first 3 the direct one
+    queries = corpus * 50
+    for batch in (queries[:3], queries):
+        result = index.par_bulk_query(batch)
+        assert [set(ids) for ids in result] == [set(range(i % 3, 150, 3)) for i in range(len(batch))]
+
+    result = index.par_bulk_query(["something completely different", corpus[0]], return_similarity=True)
+    assert result[0] == []
+    assert len(result[1]) == 50
+    assert all(distance == 0 for _, distance in result[1])
+    assert [set(ids) for ids in index.par_bulk_query(queries)] == [set(index.query(doc)) for doc in queries]
+
+
+def test_simhash_bulk_query():
+    for hash_size in (64, 128):
+        _test_simhash_bulk(SimHashStringIndex(hash_size, 6, 5))
+        _test_simhash_bulk(SimHashStringIndex(hash_size, 6, 5, analyzer='char', ngram_range=(3, 3)))
+        _test_simhash_bulk(SimHashStringIndex(hash_size, 6, 5, analyzer=str.split))
+        _test_simhash_bulk(SimHashStringIndex(hash_size, 6, 5, analyzer=lambda doc: doc.lower().split(" ")))
+
+
+def test_simhash_thread_pool():
+    _test_simhash_bulk(SimHashStringIndex(64, 6, 5, n_threads=2))
+    _test_simhash_bulk(SimHashStringIndex(64, 6, 5, analyzer=str.split, n_threads=2))